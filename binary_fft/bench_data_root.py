@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+import ethereum_data_root as e
+
+# Wall time of the list-based mk_data_root (no numpy), mk_data_root (numpy, single process)
+# and mk_data_root_parallel for 1 MB and 16 MB payloads (by default). The list-based path
+# takes minutes past a few MB, so it is only run up to LIST_BASELINE_MAX_MB
+#
+# Usage: python bench_data_root.py [processes] [size_in_mb ...]
+
+LIST_BASELINE_MAX_MB = 4
+
+if __name__ == '__main__':
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    sizes = [int(x) for x in sys.argv[2:]] or [1, 16]
+    print("Processes:", processes)
+    for size in sizes:
+        data = os.urandom(size * 2**20)
+        start_time = time.time()
+        root = e.mk_data_root(data)
+        single_time = time.time() - start_time
+        start_time = time.time()
+        assert e.mk_data_root_parallel(data, processes) == root
+        parallel_time = time.time() - start_time
+        if size <= LIST_BASELINE_MAX_MB:
+            start_time = time.time()
+            assert e.mk_data_root_lists(data) == root
+            list_time = "{0:.3f}s".format(time.time() - start_time)
+        else:
+            list_time = "skipped"
+        print("{0} MB: lists {1}, numpy single process {2:.3f}s, process pool {3:.3f}s".format(
+            size, list_time, single_time, parallel_time))
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import numpy as np
+from gf_kernel import GFKernel
+
+# Microbenchmark of the table-driven GF(2**16) kernel, in MB/s of 2-byte symbols processed,
+# for the binary_fft field and the ec65536 field (x^16 + x^15 + x^12 + x^10 + 1, generator
+# 3). The ways of multiplying are checked against each other and against scalar arithmetic
+#
+# Usage: python bench_gf_kernel.py [megabytes]
+
+def bench(name, megabytes, f, repeats=3):
+    start_time = time.time()
+    for _ in range(repeats):
+        f()
+    elapsed = (time.time() - start_time) / repeats
+    print("    %-32s %8.1f MB/s" % (name, megabytes / elapsed))
+
+def bench_field(field, megabytes):
+    print("Modulus %d (generator %d)" % (field.modulus, field.generator))
+    x = os.urandom(megabytes * 2**20)
+    xs = np.frombuffer(x, dtype='>u2').astype(np.uint16)
+    ys = np.frombuffer(os.urandom(len(x)), dtype='>u2').astype(np.uint16)
+    c = 31337
+
+    # Correctness, on a sample
+    expected = [field.mul(c, int(v)) for v in xs[:1000]]
+    assert field.mul_scalar_vec(c, xs[:1000]).tolist() == expected
+    assert field.mul_split_vec(c, xs[:1000]).tolist() == expected
+    assert field.product_table(c)[xs[:1000]].tolist() == expected
+    y = bytearray(ys[:1000].astype('>u2').tobytes())
+    field.axpy(c, x[:2000], y)
+    assert np.frombuffer(y, dtype='>u2').tolist() == [e ^ int(v) for e, v in zip(expected, ys[:1000])]
+    poly = xs[:8].tolist()
+    evals = field.eval_polys_vec(poly, ys[:100])
+    for v, e in zip(ys[:100].tolist(), evals.tolist()):
+        o = 0
+        for coeff in reversed(poly):
+            o = field.mul(o, v) ^ coeff
+        assert o == e
+
+    bench("mul_vec (log/exp)", megabytes, lambda: field.mul_vec(xs, ys))
+    bench("mul_scalar_vec (product table)", megabytes, lambda: field.mul_scalar_vec(c, xs))
+    bench("mul_split_vec (split tables)", megabytes, lambda: field.mul_split_vec(c, xs))
+    y = bytearray(len(x))
+    bench("axpy over bytes", megabytes, lambda: field.axpy(c, x, y))
+    bench("axpy over memoryview", megabytes, lambda: field.axpy(c, memoryview(x), memoryview(y)))
+    # 64 polynomials of degree 15, evaluated at 1/64th of the points each
+    polys = xs[:64 * 16].reshape(64, 16)
+    points = ys[:len(xs) // 64]
+    bench("eval_polys_vec (degree 15)", megabytes, lambda: field.eval_polys_vec(polys, points), repeats=1)
+    # Without numpy, axpy falls back to split tables in pure Python
+    small = 2**16
+    y = bytearray(small)
+    import gf_kernel
+    np_module, gf_kernel.np = gf_kernel.np, None
+    try:
+        bench("axpy, pure Python", small / 2**20, lambda: field.axpy(c, x[:small], y), repeats=1)
+    finally:
+        gf_kernel.np = np_module
+
+if __name__ == '__main__':
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    bench_field(GFKernel(65579), megabytes)
+    bench_field(GFKernel(2**16 + 2**15 + 2**12 + 2**10 + 1, 3), megabytes)
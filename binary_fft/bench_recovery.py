@@ -0,0 +1,28 @@
+import os
+import random
+import sys
+import time
+import ethereum_data_root as e
+
+# Throughput of recover_data_square on an extended square with 25%, 50% and 70% of its
+# cells lost at random
+#
+# Usage: python bench_recovery.py [payload_size_in_kb]
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    extended = e.extend_data_square(e.get_data_square(os.urandom(size * 1024)))
+    side = len(extended)
+    square_size = side * side * 32
+    for loss in (0.25, 0.5, 0.7):
+        partial = [[cell if random.random() >= loss else None for cell in row] for row in extended]
+        lost = sum(cell is None for row in partial for cell in row)
+        start_time = time.time()
+        recovered = e.recover_data_square(partial)
+        elapsed = time.time() - start_time
+        remaining = sum(cell is None for row in recovered for cell in row)
+        assert all(cell is None or cell == extended[i][j]
+                   for i, row in enumerate(recovered) for j, cell in enumerate(row))
+        print("{0:.0f}% loss: recovered {1}/{2} cells in {3:.3f}s ({4:.0f} cells/sec, {5:.2f} MB/s of extended square){6}".format(
+            loss * 100, lost - remaining, lost, elapsed, (lost - remaining) / elapsed,
+            square_size / elapsed / 2**20, "" if remaining == 0 else " - stopped at a fixpoint"))
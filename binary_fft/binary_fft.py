@@ -1,3 +1,10 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from gf_kernel import GFKernel
+
 def log2(x):
     o = 0
     while x > 1:
@@ -31,18 +38,13 @@ class BinaryField():
         self.modulus = modulus
         self.height = log2(self.modulus)
         self.order = 2**self.height - 1
-        for base in range(2, min(modulus - 1, 80)):
-            powers = [1]
-            while (len(powers) == 1 or powers[-1] != 1) and len(powers) < self.order + 2:
-                powers.append(raw_mod(raw_mul(powers[-1], base), self.modulus))
-            powers.pop()
-            if len(powers) == self.order:
-                self.cache = powers + powers
-                self.invcache = [None] * (self.order + 1)
-                for i, p in enumerate(powers):
-                    self.invcache[p] = i
-                return
-        raise Exception("Bad modulus")
+        # Tables and vectorized arithmetic come from the shared kernel
+        self.kernel = GFKernel(modulus)
+        self.cache = self.kernel.exps
+        self.invcache = self.kernel.logs
+        if np is not None:
+            self.exp_table = self.kernel.exp_table
+            self.log_table = self.kernel.log_table
 
     def add(self, x, y):
         return x ^ y
@@ -79,6 +81,21 @@ class BinaryField():
     def div(self, x, y):
         return self.mul(x, self.inv(y))
 
+    # Vectorized arithmetic (requires numpy). Takes and returns uint16 arrays, with
+    # the usual numpy broadcasting rules
+    def xor(self, x, y):
+        return np.bitwise_xor(x, y)
+
+    def mul_vec(self, x, y):
+        return self.kernel.mul_vec(x, y)
+
+    def mul_scalar_vec(self, c, x):
+        return self.kernel.mul_scalar_vec(c, x)
+
+    # Inverts every element; zeroes map to zero (as in multi_inv)
+    def inv_vec(self, x):
+        return self.kernel.inv_vec(x)
+
     # Evaluate a polynomial at a point
     def eval_poly_at(self, p, x):
         y = 0
@@ -219,7 +236,7 @@ def compose(field, poly, k):
 # Equivalent to [field.eval_poly_at(poly, x) for x in domain]
 # Special thanks to www.math.clemson.edu/~sgao/papers/GM10.pdf for insights
 # though this algorithm is not exactly identical to any algorithm in the paper
-def fft(field, domain, poly):
+def fft_scalar(field, domain, poly):
     # Base case: constant polynomials
     # if len(domain) == 1:
     #     return [poly[0]]
@@ -235,8 +252,8 @@ def fft(field, domain, poly):
     casted_domain = [field.mul(x, offset ^ x) for x in domain[::2]]
     # Two half-size sub-problems over the smaller domain, recovering
     # evaluations of evens and odds over the smaller domain
-    even_points = fft(field, casted_domain, evens)
-    odd_points = fft(field, casted_domain, odds)
+    even_points = fft_scalar(field, casted_domain, evens)
+    odd_points = fft_scalar(field, casted_domain, odds)
     # Combine the evaluations of evens and odds into evaluations of poly
     o = []
     for i in range(len(domain)//2):
@@ -245,7 +262,7 @@ def fft(field, domain, poly):
     return o
 
 # The inverse function of fft, does the steps backwards
-def invfft(field, domain, vals):
+def invfft_scalar(field, domain, vals):
     # Base case: constant polynomials
     if len(domain) == 1:
         return [vals[0]]
@@ -266,8 +283,8 @@ def invfft(field, domain, vals):
     casted_domain = [field.mul(x, offset ^ x) for x in domain[::2]]
     # Two half-size problems over the smaller domains, recovering
     # the polynomials evens and odds
-    evens = invfft(field, casted_domain, even_points)
-    odds = invfft(field, casted_domain, odd_points)
+    evens = invfft_scalar(field, casted_domain, even_points)
+    odds = invfft_scalar(field, casted_domain, odd_points)
     # Given evens and odds where poly(x) = evens(x**2+offset*x) + x * odds(x**2+offset*x),
     # recover poly
     composed_evens = compose(field, evens, offset) + [0]
@@ -275,6 +292,159 @@ def invfft(field, domain, vals):
     o = [composed_evens[i] ^ composed_odds[i] for i in range(len(vals))]
     return o
 
+# Vectorized versions of fft and invfft (requires numpy). In the recursion of fft, both
+# sub-problems (evens and odds) are over the same casted domain, so all 2**d sub-problems
+# at depth d share a domain and can be processed together as the rows of one array. These
+# functions work level by level on such arrays, and also take several polynomials (or
+# sets of evaluations) at once, one per row.
+
+# In-place cast of every row of `a` (shape (rows, m)). The recursion of cast only
+# transforms each block of the polynomial before splitting it, so it flattens to one pass
+# per block size; afterwards, evens are the even positions and odds the odd positions.
+# k_powers[i] must be k**(m / 2**(i+2))
+def _cast_vec(field, a, k_powers):
+    rows, m = a.shape
+    size = m
+    for k_to_quarter_size in k_powers:
+        # Quarters of each block: Q2 ^= Q3 * k**(size/4), then Q1 ^= Q2 * k**(size/4)
+        quarters = a.reshape(rows, m // size, 4, size // 4)
+        quarters[:, :, 2] ^= field.mul_scalar_vec(k_to_quarter_size, quarters[:, :, 3])
+        quarters[:, :, 1] ^= field.mul_scalar_vec(k_to_quarter_size, quarters[:, :, 2])
+        size //= 2
+
+# compose() applied to every row of `polys` (shape (rows, m)), returning shape (rows, 2m).
+# Works bottom-up: composed blocks of size 2s are merged pairwise into blocks of size 4s.
+# k_powers[i] must be k**(2**i)
+def _compose_vec(field, polys, k_powers):
+    rows, m = polys.shape
+    o = np.zeros((rows, m, 2), dtype=np.uint16)
+    o[:, :, 0] = polys
+    size = 1
+    for k_to_size in k_powers:
+        halves = o.reshape(rows, m // (size * 2), 2, size * 2)
+        low, high = halves[:, :, 0], halves[:, :, 1]
+        merged = np.empty((rows, m // (size * 2), size * 4), dtype=np.uint16)
+        merged[:, :, :size * 2] = low
+        merged[:, :, size * 2:] = high
+        merged[:, :, size:size * 3] ^= field.mul_scalar_vec(k_to_size, high)
+        o = merged
+        size *= 2
+    return o.reshape(rows, m * 2)
+
+# Splits every row into its even and odd positions, as two consecutive rows
+def _split_rows(a):
+    rows, m = a.shape
+    return a.reshape(rows, m // 2, 2).transpose(0, 2, 1).reshape(rows * 2, m // 2)
+
+# Everything fft_with_plan and invfft_with_plan need for one domain, computed once: the
+# casted domain and offset of every level of the recursion and the constants derived
+# from them. By default the domain is range(size)
+class FFTPlan():
+    def __init__(self, field, size, domain=None):
+        assert is_power_of_2(size)
+        self.field = field
+        self.size = size
+        domain = np.asarray(range(size) if domain is None else domain, dtype=np.uint16)
+        assert len(domain) == size
+        self.levels = []
+        while len(domain) > 1:
+            offset = int(domain[1])
+            m = len(domain)
+            xs = domain[::2].copy()
+            inv_offset = field.inv(offset)
+            self.levels.append({
+                # Multipliers of odds(x**2+kx) in poly(x) and poly(x+k)
+                'even_xs': xs,
+                'odd_xs': domain[1::2].copy(),
+                # evens(x**2+kx) = (poly(x)*(x+k) - poly(x+k)*x) / k
+                # odds(x**2+kx) = (poly(x+k) - poly(x)) / k
+                'x_plus_k_over_k': field.mul_scalar_vec(inv_offset, xs ^ offset),
+                'x_over_k': field.mul_scalar_vec(inv_offset, xs),
+                'inv_offset': inv_offset,
+                'cast_powers': [field.exp(offset, m // 2**(i+2)) for i in range(log2(m) - 1)],
+                'compose_powers': [field.exp(offset, 2**i) for i in range(log2(m) - 1)],
+            })
+            domain = field.mul_vec(xs, xs ^ offset)
+
+_fft_plans = {}
+
+# FFTPlan for range(size), cached per field and size
+def get_fft_plan(field, size):
+    key = (field.modulus, size)
+    if key not in _fft_plans:
+        _fft_plans[key] = FFTPlan(field, size)
+    return _fft_plans[key]
+
+# Evaluates every row of `polys` (shape (rows, <= plan.size)) over the plan's domain
+def fft_with_plan(plan, polys):
+    field = plan.field
+    polys = np.asarray(polys, dtype=np.uint16)
+    assert polys.shape[1] <= plan.size
+    a = np.zeros((polys.shape[0], plan.size), dtype=np.uint16)
+    a[:, :polys.shape[1]] = polys
+    # Going down: cast, and split into evens and odds over the casted domain
+    for level in plan.levels:
+        _cast_vec(field, a, level['cast_powers'])
+        a = _split_rows(a)
+    # Going up: the constant polynomials are their own evaluations; combine the evaluations
+    # of evens and odds into evaluations over the larger domain
+    for level in reversed(plan.levels):
+        half = len(level['even_xs'])
+        pairs = a.reshape(-1, 2, half)
+        even_points, odd_points = pairs[:, 0], pairs[:, 1]
+        a = np.empty((pairs.shape[0], half * 2), dtype=np.uint16)
+        a[:, ::2] = even_points ^ field.mul_vec(level['even_xs'], odd_points)
+        a[:, 1::2] = even_points ^ field.mul_vec(level['odd_xs'], odd_points)
+    return a
+
+# The inverse of fft_with_plan: interpolates every row of `vals` (shape (rows, plan.size))
+def invfft_with_plan(plan, vals):
+    field = plan.field
+    a = np.asarray(vals, dtype=np.uint16)
+    # Going down: evaluations of evens and odds over the casted domain
+    for level in plan.levels:
+        p_of_x, p_of_x_plus_k = a[:, ::2], a[:, 1::2]
+        even_points = field.mul_vec(p_of_x, level['x_plus_k_over_k']) ^ field.mul_vec(p_of_x_plus_k, level['x_over_k'])
+        odd_points = field.mul_scalar_vec(level['inv_offset'], p_of_x ^ p_of_x_plus_k)
+        a = np.stack([even_points, odd_points], axis=1).reshape(a.shape[0] * 2, len(level['even_xs']))
+    # Going up: poly(x) = evens(x**2+offset*x) + x * odds(x**2+offset*x)
+    for level in reversed(plan.levels):
+        pairs = a.reshape(-1, 2, len(level['even_xs']))
+        composed_odds = _compose_vec(field, pairs[:, 1], level['compose_powers'])
+        a = _compose_vec(field, pairs[:, 0], level['compose_powers'])
+        a[:, 1:] ^= composed_odds[:, :-1]
+    return a
+
+# Vectorized fft and invfft over an arbitrary domain, one polynomial (or set of
+# evaluations) per row
+def fft_vec(field, domain, polys):
+    return fft_with_plan(FFTPlan(field, len(domain), domain), polys)
+
+def invfft_vec(field, domain, vals):
+    return invfft_with_plan(FFTPlan(field, len(domain), domain), vals)
+
+# Below this domain size, the numpy overhead outweighs the vectorization
+MIN_VECTORIZED_FFT_SIZE = 64
+
+# The plan for range(len(domain)) can be reused if that is the domain
+def _get_plan_for_domain(field, domain):
+    if isinstance(domain, range):
+        is_standard = domain == range(len(domain))
+    else:
+        is_standard = list(domain) == list(range(len(domain)))
+    return get_fft_plan(field, len(domain)) if is_standard else FFTPlan(field, len(domain), domain)
+
+# Equivalent to [field.eval_poly_at(poly, x) for x in domain]
+def fft(field, domain, poly):
+    if np is None or len(domain) < MIN_VECTORIZED_FFT_SIZE:
+        return fft_scalar(field, domain, poly)
+    return fft_with_plan(_get_plan_for_domain(field, domain), [poly])[0].tolist()
+
+def invfft(field, domain, vals):
+    if np is None or len(domain) < MIN_VECTORIZED_FFT_SIZE:
+        return invfft_scalar(field, domain, vals)
+    return invfft_with_plan(_get_plan_for_domain(field, domain), [vals])[0].tolist()
+
 # shift_polys[i][j] is the 2**j degree coefficient of the polynomial that evaluates to [1,1...1, 0,0....0] with 2**(i-1) ones and 2**(i-1) zeroes
 shift_polys = [[], [1], [32755, 32755], [52774, 60631, 8945], [38902, 5560, 44524, 12194], [55266, 46488, 60321, 5401, 40130], [21827, 32224, 51565, 15072, 8277, 64379], [59460, 15452, 60370, 24737, 20321, 35516, 39606], [42623, 56997, 25925, 15351, 16625, 47045, 38250, 17462], [7575, 27410, 32434, 22187, 28933, 15447, 37964, 38186, 4776], [39976, 61188, 42456, 2155, 6178, 34033, 52305, 14913, 2896, 48908], [6990, 12021, 36054, 16198, 17011, 14018, 58553, 13272, 25318, 5288, 21429], [16440, 34925, 14360, 22561, 43883, 36645, 7613, 26531, 8597, 59502, 61283, 53412]]
 
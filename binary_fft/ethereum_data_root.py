@@ -1,7 +1,13 @@
 # import fast_binary_fft as b
 import binary_fft as b
 f = b.BinaryField(65579)
+from collections import OrderedDict
 from hashlib import sha256
+import os
+try:
+    import numpy as np
+except ImportError:
+    np = None
 def hash(x): return sha256(x).digest()
 
 log2 = b.log2
@@ -142,23 +148,246 @@ def extend_data_square(square: List[List[Bytes32]]) -> List[List[Bytes32]]:
     Extends a 2**k x 2**k square to 2**(k+1) x 2**(k+1) using `fill_axis` to
     fill rows and columns.
     """
+    if np is not None:
+        return array_to_square(extend_data_square_array(square_to_array(square)))
     L = len(square)
     # Extend each row
     square = [fill_axis(list(range(L)), row, L * 2) for row in square]
     # Flip rows and columns
-    square = [[square[j][i] for i in range(L)] for j in range(len(square))]
+    square = [[square[j][i] for j in range(L)] for i in range(L * 2)]
     # Extend each column
     square = [fill_axis(list(range(L)), row, L * 2) for row in square]
     # Flip back to row form
-    square = [[square[j][i] for i in range(L)] for j in range(len(square))]
+    square = [[square[j][i] for j in range(L * 2)] for i in range(L * 2)]
     return square
 
+#########################################################################################
+#
+# Vectorized pipeline (requires numpy): the square is a single uint16 array of shape
+# (rows, columns, 16), the last axis holding the 16 field elements of each 32-byte chunk
+# (in little-endian order, as in fill_axis)
+#
+#########################################################################################
+
+def square_to_array(square: List[List[Bytes32]]):
+    L = len(square)
+    return np.frombuffer(b''.join(b''.join(row) for row in square), dtype='<u2').reshape(L, len(square[0]), 16)
+
+def array_to_square(array) -> List[List[Bytes32]]:
+    data = array.astype('<u2', copy=False).tobytes()
+    rows, columns = array.shape[:2]
+    return [[data[(i * columns + j) * 32: (i * columns + j + 1) * 32] for j in range(columns)] for i in range(rows)]
+
+def extend_lanes(lanes):
+    """
+    Treats each row of lanes (shape (count, L)) as the evaluations of a polynomial over
+    range(L) and evaluates it over range(2 * L)
+    """
+    L = lanes.shape[1]
+    polys = b.invfft_with_plan(b.get_fft_plan(f, L), lanes)
+    return b.fft_with_plan(b.get_fft_plan(f, L * 2), polys)
+
+def extend_data_square_array(array):
+    """
+    Same as extend_data_square, on an array of shape (L, L, 16). Every row (and then every
+    column) of every lane is extended in one batch of transforms; the transposes are
+    views, copied only when reshaped into the batch
+    """
+    L = array.shape[0]
+    # Extend each row: batch of (row, lane) polynomials over the column index
+    lanes = array.transpose(0, 2, 1).reshape(L * 16, L)
+    array = extend_lanes(lanes).reshape(L, 16, L * 2).transpose(0, 2, 1)
+    # Extend each column: batch of (column, lane) polynomials over the row index
+    lanes = array.transpose(1, 2, 0).reshape(L * 32, L)
+    return extend_lanes(lanes).reshape(L * 2, 16, L * 2).transpose(2, 0, 1)
+
+def get_axis_roots(array) -> List[Bytes32]:
+    """
+    Merkle roots of all rows of an array of shape (rows, columns, 16), hashing the chunks
+    straight out of one contiguous buffer
+    """
+    data = memoryview(np.ascontiguousarray(array).astype('<u2', copy=False).tobytes())
+    row_size = array.shape[1] * 32
+    return [
+        get_merkle_root([bytes(data[i + j: i + j + 32]) for j in range(0, row_size, 32)])
+        for i in range(0, len(data), row_size)
+    ]
+
+#########################################################################################
+#
+# Recovery of a square from a partial set of cells (requires numpy). Every row and column
+# of the extended square is a polynomial of degree < L (per lane) over range(2L), so any
+# line with at least half of its cells can be decoded; decoding rows can make columns
+# decodable and vice versa
+#
+#########################################################################################
+
+_recovery_patterns = OrderedDict()
+MAX_CACHED_RECOVERY_PATTERNS = 256
+
+def get_recovery_pattern(length, missing):
+    """
+    For lines of the given length with cells missing at the given positions, the
+    evaluations of the vanishing polynomial z of the missing positions over range(length),
+    and the inverses of its evaluations over range(length, 2 * length) (cached per pattern)
+    """
+    key = (length, missing)
+    if key in _recovery_patterns:
+        _recovery_patterns.move_to_end(key)
+        return _recovery_patterns[key]
+    # z(x) = prod(x - m for m in missing), evaluated directly as a sum of logarithms
+    xs = np.arange(length * 2)
+    differences = xs[np.newaxis, :] ^ np.array(missing)[:, np.newaxis]
+    z_values = f.exp_table[f.log_table[differences].sum(axis=0) % f.order]
+    z_values[list(missing)] = 0
+    pattern = (z_values[:length], f.inv_vec(z_values[length:]))
+    _recovery_patterns[key] = pattern
+    if len(_recovery_patterns) > MAX_CACHED_RECOVERY_PATTERNS:
+        _recovery_patterns.popitem(last=False)
+    return pattern
+
+def recover_lanes(lanes, z_values, inv_shifted_z_values):
+    """
+    Recovers every row of lanes (shape (count, length), arbitrary values at the missing
+    positions) as the evaluations over range(length) of a polynomial of degree
+    < length - len(missing), given the recovery pattern of each row (see
+    get_recovery_pattern, stacked into arrays of shape (count, length))
+    """
+    length = lanes.shape[1]
+    plan, big_plan = b.get_fft_plan(f, length), b.get_fft_plan(f, length * 2)
+    # p * z is known everywhere (it is zero at the missing positions), and has degree < length
+    p_times_z = b.invfft_with_plan(plan, f.mul_vec(lanes, z_values))
+    # Divide by z over range(length, 2 * length), where z has no zeroes. This gives the
+    # values of p(x + length) over range(length), so q(x) = p(x + length) ...
+    shifted_p_values = f.mul_vec(b.fft_with_plan(big_plan, p_times_z)[:, length:], inv_shifted_z_values)
+    shifted_p = b.invfft_with_plan(plan, shifted_p_values)
+    # ... and p(x) = q(x + length) for x in range(length)
+    return b.fft_with_plan(big_plan, shifted_p)[:, length:]
+
+def recover_data_square(partial_square: List[List[Bytes32]]) -> List[List[Bytes32]]:
+    """
+    Takes an extended 2L x 2L square with None for missing cells, and decodes rows and
+    columns with at least L known cells until no more progress can be made. Returns the
+    square, with None for the cells that could not be recovered
+    """
+    size = len(partial_square)
+    known = np.array([[cell is not None for cell in row] for row in partial_square])
+    square = np.frombuffer(b''.join(cell or ZERO_HASH for row in partial_square for cell in row),
+                           dtype='<u2').reshape(size, size, 16).copy()
+    progress = True
+    while progress:
+        progress = False
+        # Rows, then columns (through transposed views of the same arrays)
+        for lines, lines_known in ((square, known), (square.transpose(1, 0, 2), known.T)):
+            missing_counts = size - lines_known.sum(axis=1)
+            indices = np.flatnonzero((missing_counts > 0) & (missing_counts <= size // 2))
+            if len(indices) == 0:
+                continue
+            # All decodable lines are recovered in one batch; only the recovery pattern
+            # differs between lines (and it is the same for the 16 lanes of a line)
+            patterns = [get_recovery_pattern(size, tuple(np.flatnonzero(~lines_known[i]).tolist())) for i in indices]
+            z_values = np.repeat(np.stack([z for z, _ in patterns]), 16, axis=0)
+            inv_shifted_z_values = np.repeat(np.stack([inv_z for _, inv_z in patterns]), 16, axis=0)
+            lanes = lines[indices].transpose(0, 2, 1).reshape(len(indices) * 16, size)
+            recovered = recover_lanes(lanes, z_values, inv_shifted_z_values)
+            lines[indices] = recovered.reshape(len(indices), 16, size).transpose(0, 2, 1)
+            lines_known[indices] = True
+            progress = True
+    data = square.astype('<u2', copy=False).tobytes()
+    return [[data[(i * size + j) * 32: (i * size + j + 1) * 32] if known[i, j] else None
+             for j in range(size)] for i in range(size)]
+
+#########################################################################################
+#
+# Process pool mode: the extended square lives in shared memory; rows, then columns (and
+# then the row and column Merkle roots) are split across the workers
+#
+#########################################################################################
+
+def _attach_square(name, L):
+    """
+    Attach to the shared extended square of a 2**k x 2**k data square
+    """
+    from multiprocessing import shared_memory
+    # The parent process owns (and unlinks) the block; workers only close it
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray((L * 2, L * 2, 16), dtype='<u2', buffer=shm.buf)
+
+def _extend_rows_worker(args):
+    name, L, start, end = args
+    shm, square = _attach_square(name, L)
+    lanes = square[start:end, :L].transpose(0, 2, 1).reshape((end - start) * 16, L)
+    square[start:end] = extend_lanes(lanes).reshape(end - start, 16, L * 2).transpose(0, 2, 1)
+    del square
+    shm.close()
+
+def _extend_columns_worker(args):
+    name, L, start, end = args
+    shm, square = _attach_square(name, L)
+    lanes = square[:L, start:end].transpose(1, 2, 0).reshape((end - start) * 16, L)
+    square[:, start:end] = extend_lanes(lanes).reshape(end - start, 16, L * 2).transpose(2, 0, 1)
+    del square
+    shm.close()
+
+def _axis_roots_worker(args):
+    name, L, axis, start, end = args
+    shm, square = _attach_square(name, L)
+    rows = square[start:end] if axis == 0 else square[:, start:end].transpose(1, 0, 2)
+    roots = get_axis_roots(rows)
+    del square, rows
+    shm.close()
+    return roots
+
+def _split_range(length, parts):
+    step = -(-length // parts)
+    return [(i, min(i + step, length)) for i in range(0, length, step)]
+
+def mk_data_root_parallel(data: bytes, processes=None) -> Bytes32:
+    """
+    Same as mk_data_root, with the work split across a pool of processes that share the
+    square through multiprocessing.shared_memory
+    """
+    from multiprocessing import Pool, shared_memory
+    processes = processes or os.cpu_count()
+    array = square_to_array(get_data_square(data))
+    L = array.shape[0]
+    shm = shared_memory.SharedMemory(create=True, size=L * L * 4 * 32)
+    try:
+        square = np.ndarray((L * 2, L * 2, 16), dtype='<u2', buffer=shm.buf)
+        square[:L, :L] = array
+        with Pool(processes) as pool:
+            parts = processes * 4
+            # Rows of the original square, then all columns of the half-extended square
+            pool.map(_extend_rows_worker, [(shm.name, L, start, end) for start, end in _split_range(L, parts)])
+            pool.map(_extend_columns_worker, [(shm.name, L, start, end) for start, end in _split_range(L * 2, parts)])
+            row_roots, column_roots = [
+                sum(pool.map(_axis_roots_worker, [(shm.name, L, axis, start, end)
+                                                  for start, end in _split_range(L * 2, parts)]), [])
+                for axis in (0, 1)
+            ]
+        del square
+        return hash(get_merkle_root(row_roots) + get_merkle_root(column_roots))
+    finally:
+        shm.close()
+        shm.unlink()
+
 def mk_data_root(data: bytes) -> Bytes32:
     """
     Computes the root of the package of rows and colums of a given piece of data.
     """
+    if np is not None:
+        square = extend_data_square_array(square_to_array(get_data_square(data)))
+        row_roots = get_axis_roots(square)
+        column_roots = get_axis_roots(square.transpose(1, 0, 2))
+        return hash(get_merkle_root(row_roots) + get_merkle_root(column_roots))
+    return mk_data_root_lists(data)
+
+def mk_data_root_lists(data: bytes) -> Bytes32:
+    """
+    mk_data_root on lists of cells, without numpy
+    """
     square = extend_data_square(get_data_square(data))
     row_roots = [get_merkle_root(r) for r in square]
-    transposed_square = [[square[j][i] for i in range(len(square))] for j in range(len(square))]
+    transposed_square = [[square[j][i] for j in range(len(square))] for i in range(len(square))]
     column_roots = [get_merkle_root(r) for r in transposed_square]
     return hash(get_merkle_root(row_roots) + get_merkle_root(column_roots))
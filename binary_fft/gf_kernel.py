@@ -0,0 +1,15 @@
+import importlib.util
+import os
+import sys
+
+# The GF(2**16) kernel lives in erasure_code/ec65536/ec65536/gf_kernel.py. Load that module
+# under this name, so that `from gf_kernel import ...` in this directory gets it (with its own
+# __file__ and namespace) instead of a copy
+def _load_shared_module():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'erasure_code', 'ec65536', 'ec65536', 'gf_kernel.py')
+    spec = importlib.util.spec_from_file_location(__name__, os.path.normpath(path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[__name__] = module
+    spec.loader.exec_module(module)
+
+_load_shared_module()
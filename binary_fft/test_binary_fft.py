@@ -18,3 +18,7 @@ ys = [bigf.eval_poly_at(poly3, x) for x in xs]
 poly5 = binary_fft.interpolate(bigf, xs, ys)
 assert poly5[:len(poly3)] == poly3
 print("Interpolation tests passed")
+plan = binary_fft.get_fft_plan(bigf, 1024)
+assert binary_fft.fft_with_plan(plan, [poly])[0].tolist() == z
+assert binary_fft.invfft_with_plan(plan, [z])[0].tolist() == poly
+print("FFT plan tests passed")
@@ -0,0 +1,45 @@
+import random
+import sys
+import time
+from py_ecc import optimized_bls12_381 as b
+from bulletproofs import (
+    DEFAULT_GENERATOR_POINTS_FILE, commit, load_generator_points, prove_evaluation, verify_evaluation, verify_evaluations_batch
+)
+
+# Compares the verification time per evaluation proof when verifying proofs one by one
+# and with verify_evaluations_batch, at batch sizes 1, 16 and 256 (by default). All proofs
+# use the same generator points.
+#
+# Usage: python bench_batch_verify.py [log_size] [max_batch_size] [cache_file]
+
+if __name__ == '__main__':
+    log_size = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    max_batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    cache_file = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_GENERATOR_POINTS_FILE
+    size = 2**log_size
+
+    points = load_generator_points(size + 1, cache_file)
+    # Build a pool of proofs (over a few polynomials) to draw the batches from
+    start_time = time.time()
+    proofs = []
+    polys = [[random.randrange(b.curve_order) for _ in range(size)] for _ in range(4)]
+    commitments = [commit(points, poly) for poly in polys]
+    for i in range(max_batch_size):
+        poly, commitment = polys[i % len(polys)], commitments[i % len(polys)]
+        x = random.randrange(b.curve_order)
+        y = sum(c * pow(x, j, b.curve_order) for j, c in enumerate(poly)) % b.curve_order
+        proofs.append((commitment, prove_evaluation(points, commitment, poly, x, y), x, y))
+    print("Generated {0} proofs of size {1}: {2:.3f}s".format(max_batch_size, size, time.time() - start_time))
+
+    for batch_size in (1, 16, 256):
+        if batch_size > max_batch_size:
+            break
+        batch = proofs[:batch_size]
+        start_time = time.time()
+        assert all(verify_evaluation(points, *proof) for proof in batch)
+        single_time = (time.time() - start_time) / batch_size
+        start_time = time.time()
+        assert verify_evaluations_batch(points, batch)
+        batch_time = (time.time() - start_time) / batch_size
+        print("batch size {0:<4d} one by one {1:.4f}s/proof  batched {2:.4f}s/proof  ({3:.1f}x)"
+              .format(batch_size, single_time, batch_time, single_time / batch_time))
@@ -0,0 +1,56 @@
+import random
+import sys
+import time
+from py_ecc import optimized_bls12_381 as b
+from bulletproofs import (
+    DEFAULT_GENERATOR_POINTS_FILE, commit, load_generator_points, read_generator_points, prove, verify, prove_evaluation, verify_evaluation
+)
+
+# Benchmarks the inner product prover and verifier over vector sizes 2^6 ... 2^12
+# (by default). The generator points are cached on disk, so only the first run pays
+# for generating them.
+#
+# Usage: python bench_bulletproofs.py [min_log_size] [max_log_size] [cache_file]
+
+if __name__ == '__main__':
+    min_log_size = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    max_log_size = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    cache_file = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_GENERATOR_POINTS_FILE
+
+    start_time = time.time()
+    # One extra point for H in the evaluation proofs
+    points = load_generator_points(2**max_log_size + 1, cache_file)
+    print("Loaded {0} generator points: {1:.3f}s".format(len(points), time.time() - start_time))
+
+    # Truncated or corrupted caches are rejected (and regenerated by load_generator_points)
+    import os, tempfile
+    with open(cache_file, 'rb') as f:
+        cache = f.read(16 * 48)
+    bad_cache_file = os.path.join(tempfile.mkdtemp(), 'generator_points.bin')
+    for bad_cache in [cache[:-1], cache[:48 * 5] + bytes(48) + cache[48 * 6:]]:
+        with open(bad_cache_file, 'wb') as f:
+            f.write(bad_cache)
+        assert read_generator_points(15, bad_cache_file) is None
+
+    for log_size in range(min_log_size, max_log_size + 1):
+        size = 2**log_size
+        poly = [random.randrange(b.curve_order) for _ in range(size)]
+        x = random.randrange(b.curve_order)
+        y = sum(c * pow(x, i, b.curve_order) for i, c in enumerate(poly)) % b.curve_order
+        commitment = commit(points, poly)
+
+        times = []
+        start_time = time.time()
+        proof = prove(points, commitment, poly)
+        times.append(time.time() - start_time)
+        start_time = time.time()
+        assert verify(points, commitment, proof)
+        times.append(time.time() - start_time)
+        start_time = time.time()
+        proof = prove_evaluation(points, commitment, poly, x, y)
+        times.append(time.time() - start_time)
+        start_time = time.time()
+        assert verify_evaluation(points, commitment, proof, x, y)
+        times.append(time.time() - start_time)
+        print("n=2^{0:<3d} prove {1:.3f}s  verify {2:.3f}s  prove_evaluation {3:.3f}s  verify_evaluation {4:.3f}s"
+              .format(log_size, *times))
@@ -1,7 +1,10 @@
 from py_ecc import optimized_bls12_381 as b
+from py_ecc.bls.point_compression import compress_G1, decompress_G1
 from hashlib import sha256
 from dataclasses import dataclass
 from multicombs import lincomb
+import os
+import secrets
 import time
 
 # See page 25 and 29 of https://eprint.iacr.org/2020/1536.pdf and
@@ -32,6 +35,51 @@ def mk_generator_points(count):
     return points
 
 
+POINT_SIZE = 48
+
+
+# Default cache file for load_generator_points, next to this file
+DEFAULT_GENERATOR_POINTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generator_points.bin')
+
+
+# Reads count generator points from a cache file, or returns None if the file is missing,
+# too short or invalid. Every point must decompress to a point on the curve (which rejects
+# bad encodings); G1 subgroup membership is checked for all points at once on a random
+# linear combination, which a corrupted or foreign file fails with overwhelming probability
+def read_generator_points(count, filename):
+    if not os.path.exists(filename) or os.path.getsize(filename) % POINT_SIZE != 0 or \
+            os.path.getsize(filename) < count * POINT_SIZE:
+        return None
+    with open(filename, 'rb') as f:
+        data = f.read(count * POINT_SIZE)
+    try:
+        points = [
+            decompress_G1(int.from_bytes(data[i:i+POINT_SIZE], 'big'))
+            for i in range(0, len(data), POINT_SIZE)
+        ]
+    except ValueError:
+        return None
+    if any(b.is_inf(pt) for pt in points):
+        return None
+    combination = lincomb(points, [secrets.randbelow(2**128) for _ in points], b.add, b.Z1)
+    if not b.is_inf(b.multiply(combination, b.curve_order)):
+        return None
+    return points
+
+
+# Same as mk_generator_points, but caches the points (compressed) in a file, so that
+# they only have to be generated once. A valid cache holding more points than needed is
+# reused; an invalid one is overwritten
+def load_generator_points(count, filename=DEFAULT_GENERATOR_POINTS_FILE):
+    points = read_generator_points(count, filename)
+    if points is not None:
+        return points
+    points = mk_generator_points(count)
+    with open(filename, 'wb') as f:
+        f.write(b''.join(compress_G1(pt).to_bytes(POINT_SIZE, 'big') for pt in points))
+    return points
+
+
 # Commit to some polynomial
 def commit(generator_points, poly):
     # Equivalent (but faster) to this:
@@ -63,6 +111,51 @@ def right_half(x):
     return x[len(x)//2:]
 
 
+# Generate the challenge for a round from the previous Fiat-Shamir value and the
+# round's L and R
+def get_challenge(r, L, R):
+    r = hash(r + serialize_point(L) + serialize_point(R))
+    return r, int.from_bytes(r, 'little') % b.curve_order
+
+
+# Folding a vector of size m with the challenge a turns x[j] into x[j] * a + x[j + m/2].
+# Applied to the base points over all rounds, points[i] ends up in the final base point
+# with coefficient s[i]. Since the first fold splits the points by their top index bit,
+# s is built by interleaving: [s0 * a, s0, s1 * a, s1, ...] after each round
+def fold_coeffs(coeffs, a):
+    o = []
+    for x in coeffs:
+        o.append((x * a) % b.curve_order)
+        o.append(x)
+    return o
+
+
+# Commit to poly using the base points of the current round, without computing these
+# (folded) base points: if the current round has m base points, then base point j is
+# sum(points[j + t*m] * points_coeffs[t]), so the commitment is one MSM over the
+# original points. `offset` selects the left (0) or right (m/2) half of the base points
+def commit_folded(points, points_coeffs, poly, offset):
+    m = 2 * len(poly)
+    base, factors = [], []
+    for t, c in enumerate(points_coeffs):
+        base.extend(points[offset + t*m: offset + t*m + len(poly)])
+        factors.extend((p * c) % b.curve_order for p in poly)
+    return lincomb(base, factors, b.add, b.Z1)
+
+
+# For challenges a_0 ... a_(k-1), the final commitment of the verifier is
+# prod(a) * commitment + sum_i prod(a_(i+1) ... a_(k-1)) * (L_i + a_i^2 * R_i).
+# Returns prod(a) and the coefficients of the L_i and R_i
+def get_commitment_coeffs(challenges):
+    L_coeffs, R_coeffs = [], []
+    suffix_product = 1
+    for a in reversed(challenges):
+        L_coeffs.append(suffix_product)
+        R_coeffs.append((suffix_product * a * a) % b.curve_order)
+        suffix_product = (suffix_product * a) % b.curve_order
+    return suffix_product, L_coeffs[::-1], R_coeffs[::-1]
+
+
 # The data structure for a proof
 @dataclass
 class Proof():
@@ -83,23 +176,23 @@ def prove(points, commitment, poly):
     R = []
     # Fiat-shamir randomness value
     r = hash(serialize_point(commitment))
+    # Instead of halving the base points every round (which costs a point multiplication
+    # per point), we keep the original points and track how they combine into the
+    # current round's base points (see commit_folded)
+    points_coeffs = [1]
     # log(n) rounds...
     while len(poly) > 1:
         # Generate the left-side and right-side points
         polyL, polyR = left_half(poly), right_half(poly)
-        pointsL, pointsR = left_half(points), right_half(points)
-        yL = commit(pointsR, polyL)
-        yR = commit(pointsL, polyR)
+        yL = commit_folded(points, points_coeffs, polyL, len(polyL))
+        yR = commit_folded(points, points_coeffs, polyR, 0)
         L.append(yL)
         R.append(yR)
         # Generate random coefficient for recombining the L and R and commitment
-        r = hash(r + serialize_point(yL) + serialize_point(yR))
-        a = int.from_bytes(r, 'little') % b.curve_order
-        # print('a value: ', a)
+        r, a = get_challenge(r, yL, yR)
         # Generate half-size polynomial and points for the next round
         poly = [(cL + cR * a) % b.curve_order for (cL, cR) in zip(polyL, polyR)]
-        points = [b.add(b.multiply(pL, a), pR) for (pL, pR) in zip(pointsL, pointsR)]
-        # print('intermediate commitment:', commit(points, poly))
+        points_coeffs = fold_coeffs(points_coeffs, a)
     return Proof(L, R, poly[0])
 
 
@@ -108,34 +201,27 @@ def verify(points, commitment, proof):
     points = points[:2**len(proof.L)]
     # Fiat-shamir randomness value
     r = hash(serialize_point(commitment))
-    # For verification, we need to generate the same random linear combination of
-    # base points that the prover did.. But because we don't need to use it until
-    # the end, we do it more efficiently here: when we progress through the rounds,
-    # we keep track of how many times each points[i] will appear in the final
-    # result...
-    points_coeffs = [1]
-    # log(n) rounds, just like the prover...
+    # Regenerate the random coefficients of all rounds (same as the prover)
+    challenges = []
     for i in range(len(proof.L)):
-        r = hash(r + serialize_point(proof.L[i]) + serialize_point(proof.R[i]))
-        # Generate random coefficient for recombining (same as the prover)
-        a = int.from_bytes(r, 'little') % b.curve_order
-        # print('a value: ', a)
-        # Add L and R into the commitment, applying the appropriate coefficients
-        commitment = b.add(
-            proof.L[i],
-            b.add(
-                b.multiply(commitment, a),
-                b.multiply(proof.R[i], a**2)
-            )
-        )
-        # print('intermediate commitment:', commitment)
-        # Update the coefficients (points_coeffs[i] = how many times points[i] will
-        # appear in the single base point of the last round)
-        points_coeffs = sum([[(x*a) % b.curve_order, x] for x in points_coeffs], [])
-    # Finally, we do the linear combination
-    combined_point = lincomb(points, points_coeffs, b.add, b.Z1)
-    # Base case check: base_point * coefficient ?= commitment
-    return b.eq(b.multiply(combined_point, proof.tip), commitment)
+        r, a = get_challenge(r, proof.L[i], proof.R[i])
+        challenges.append(a)
+    # Rather than folding L and R into the commitment round by round, we compute the
+    # coefficient of every point in the final check directly. points_coeffs[i] = how many
+    # times points[i] appears in the single base point of the last round
+    points_coeffs = [1]
+    for a in challenges:
+        points_coeffs = fold_coeffs(points_coeffs, a)
+    commitment_coeff, L_coeffs, R_coeffs = get_commitment_coeffs(challenges)
+    # Base case check: base_point * tip ?= final commitment, done as a single
+    # linear combination that has to come out as zero
+    check = lincomb(
+        points + [commitment] + proof.L + proof.R,
+        [(c * proof.tip) % b.curve_order for c in points_coeffs] +
+        [(-c) % b.curve_order for c in [commitment_coeff] + L_coeffs + R_coeffs],
+        b.add, b.Z1, b.neg
+    )
+    return b.is_inf(check)
 
 
 # Prove that `commitment` actually is the commitment to a polynomial
@@ -157,78 +243,104 @@ def prove_evaluation(points, commitment, poly, x, y):
     r = hash(serialize_point(commitment) + x.to_bytes(32, 'little') + y.to_bytes(32, 'little'))
     # For security, we randomize H
     H = b.multiply(H, int.from_bytes(r, 'little') % b.curve_order)
+    # As in prove(), the base points are not folded, only their coefficients
+    points_coeffs = [1]
     while len(poly) > 1:
         # Generate the left-side and right-side points, except we also mix in a similarly
         # constructed "commitment" that uses `H * powers of x` as its base instead of the
         # base points.
         polyL, polyR = left_half(poly), right_half(poly)
-        pointsL, pointsR = left_half(points), right_half(points)
         xpowersL, xpowersR = left_half(xpowers), right_half(xpowers)
-        yL = commit(pointsR, polyL)
-        yR = commit(pointsL, polyR)
-        L.append(b.add(yL, b.multiply(H, sum(a*b for a,b in zip(xpowersR, polyL)))))
-        R.append(b.add(yR, b.multiply(H, sum(a*b for a,b in zip(xpowersL, polyR)))))
+        yL = commit_folded(points, points_coeffs, polyL, len(polyL))
+        yR = commit_folded(points, points_coeffs, polyR, 0)
+        L.append(b.add(yL, b.multiply(H, sum(a*b for a,b in zip(xpowersR, polyL)) % b.curve_order)))
+        R.append(b.add(yR, b.multiply(H, sum(a*b for a,b in zip(xpowersL, polyR)) % b.curve_order)))
         # Generate random coefficient for recombining the L and R and commitment
-        r = hash(r + serialize_point(L[-1]) + serialize_point(R[-1]))
-        a = int.from_bytes(r, 'little') % b.curve_order
-        # print('a value: ', a)
+        r, a = get_challenge(r, L[-1], R[-1])
         # Generate half-size polynomial and points for the next round. Notice how we treat
         # the powers of x the same way that we do the base points
         poly = [(cL + cR * a) % b.curve_order for (cL, cR) in zip(polyL, polyR)]
-        points = [b.add(b.multiply(pL, a), pR) for (pL, pR) in zip(pointsL, pointsR)]
+        points_coeffs = fold_coeffs(points_coeffs, a)
         xpowers = [(xL * a + xR) % b.curve_order for (xL, xR) in zip(xpowersL, xpowersR)]
-        # print('intermediate commitment:', b.add(commit(points, poly), b.multiply(H, sum(a*b for a,b in zip(xpowers, poly)))))
     return Proof(L, R, poly[0])
 
 
-# Verify a proof of an evaluation made using the above protocol
-def verify_evaluation(points, commitment, proof, x, y):
-    # Crop the base points to just what we need. We add an additional base point,
-    # which we will use to mix in the _evaluation_ of the polynomial.
-    points, H = points[:2**len(proof.L)], points[2**len(proof.L)]
+# Returns the check of an evaluation proof as a linear combination that is zero iff the
+# proof is valid: the coefficients of the base points (including the extra base point H,
+# at index 2**len(proof.L)), plus a list of other points and their coefficients
+def get_evaluation_check(points, commitment, proof, x, y):
+    n = 2**len(proof.L)
     # Powers of x, as in the prover
-    xpowers = [pow(x, i, b.curve_order) for i in range(len(poly))]
+    xpowers = [pow(x, i, b.curve_order) for i in range(n)]
     # Fiat-shamir randomness value
     r = hash(serialize_point(commitment) + x.to_bytes(32, 'little') + y.to_bytes(32, 'little'))
-    # For security, we randomize H
-    H = b.multiply(H, int.from_bytes(r, 'little') % b.curve_order)
-    # We "mix in" H * the claimed evaluation P(x) = y. Notice that `H * P(x)` equals the
-    # dot-product of `H * powers of x` and the polynomial coefficients, so it has the
-    # "same format" as the polynomial commitment itself. This allows us to verify the
-    # evaluation using the same technique that we use to just prove that the commitment
-    # is valid
-    commitment = b.add(commitment, b.multiply(H, y))
+    # The prover randomizes H by this factor, for security
+    H_factor = int.from_bytes(r, 'little') % b.curve_order
+    # Regenerate the random coefficients of all rounds (same as the prover)
+    challenges = []
+    for i in range(len(proof.L)):
+        r, a = get_challenge(r, proof.L[i], proof.R[i])
+        challenges.append(a)
     # Track the linear combination so we can generate the final-round point and xpower,
-    # just as before
+    # as in verify()
     points_coeffs = [1]
-    for i in range(len(proof.L)):
-        # Generate random coefficient for recombining (same as the prover)
-        r = hash(r + serialize_point(proof.L[i]) + serialize_point(proof.R[i]))
-        a = int.from_bytes(r, 'little') % b.curve_order
-        # print('a value: ', a)
-        # Add L and R into the commitment, applying the appropriate coefficients
-        commitment = b.add(
-            proof.L[i],
-            b.add(
-                b.multiply(commitment, a),
-                b.multiply(proof.R[i], a**2)
-            )
-        )
-        # print('intermediate commitment:', commitment)
-        # Update the coefficients (as in basic verification above)
-        points_coeffs = sum([[(x*a) % b.curve_order, x] for x in points_coeffs], [])
-    # Finally, we do the linear combination; same one for base points and x powers
-    combined_point = lincomb(points, points_coeffs, b.add, b.Z1)
-    combined_x_powers = sum(p*c for p,c in zip(xpowers, points_coeffs))
-    # Base case check: base_point * coefficient ?= commitment. Note that here we
-    # have to also mix H * the combined xpower into the final base point
-    return b.eq(
-        b.add(
-            b.multiply(combined_point, proof.tip),
-            b.multiply(H, (proof.tip * combined_x_powers) % b.curve_order)
-        ),
-        commitment
+    for a in challenges:
+        points_coeffs = fold_coeffs(points_coeffs, a)
+    combined_x_powers = sum(p*c for p,c in zip(xpowers, points_coeffs)) % b.curve_order
+    # The verifier "mixes in" H * the claimed evaluation P(x) = y into the commitment.
+    # Notice that `H * P(x)` equals the dot-product of `H * powers of x` and the polynomial
+    # coefficients, so it has the "same format" as the polynomial commitment itself. This
+    # allows us to verify the evaluation using the same technique that we use to just
+    # prove that the commitment is valid. Then, from the base case check
+    #   base_point * tip + H * (tip * combined xpower) ?= final commitment
+    # we collect the coefficients of all points
+    commitment_coeff, L_coeffs, R_coeffs = get_commitment_coeffs(challenges)
+    generator_coeffs = [(c * proof.tip) % b.curve_order for c in points_coeffs]
+    generator_coeffs.append(H_factor * (proof.tip * combined_x_powers - commitment_coeff * y) % b.curve_order)
+    return (
+        generator_coeffs,
+        [commitment] + proof.L + proof.R,
+        [(-c) % b.curve_order for c in [commitment_coeff] + L_coeffs + R_coeffs]
+    )
+
+
+# Verify a proof of an evaluation made using the above protocol
+def verify_evaluation(points, commitment, proof, x, y):
+    generator_coeffs, other_points, other_coeffs = get_evaluation_check(points, commitment, proof, x, y)
+    check = lincomb(
+        points[:len(generator_coeffs)] + other_points,
+        generator_coeffs + other_coeffs,
+        b.add, b.Z1, b.neg
+    )
+    return b.is_inf(check)
+
+
+# Verify many evaluation proofs at once. `proofs` is a list of (commitment, proof, x, y).
+# Every proof's check is a linear combination that must be zero; we multiply each by a
+# random weight and add them up, so the base point coefficients of all proofs merge and
+# the whole batch is a single lincomb. If it is zero, all proofs are valid (except with
+# negligible probability); if not, at least one is invalid (use verify_evaluation to find
+# out which)
+def verify_evaluations_batch(points, proofs):
+    generator_coeffs = []
+    other_points, other_coeffs = [], []
+    for commitment, proof, x, y in proofs:
+        weight = secrets.randbits(128)
+        coeffs, pts, cfs = get_evaluation_check(points, commitment, proof, x, y)
+        # Proofs of different sizes share a prefix of the base points (and the extra base
+        # point H of a proof is a regular base point of larger proofs), so the coefficients
+        # simply add up per point
+        generator_coeffs.extend([0] * (len(coeffs) - len(generator_coeffs)))
+        for i, c in enumerate(coeffs):
+            generator_coeffs[i] = (generator_coeffs[i] + weight * c) % b.curve_order
+        other_points.extend(pts)
+        other_coeffs.extend((weight * c) % b.curve_order for c in cfs)
+    check = lincomb(
+        points[:len(generator_coeffs)] + other_points,
+        generator_coeffs + other_coeffs,
+        b.add, b.Z1, b.neg
     )
+    return b.is_inf(check)
 
 
 time_cache = [time.time()]
@@ -254,3 +366,9 @@ if __name__ == '__main__':
     print("Evaluation proof generated: {:.3f}s".format(get_time_delta()))
     assert verify_evaluation(points, commitment, proof2, 10, 3979853562951413)
     print("Evaluation proof verified: {:.3f}s".format(get_time_delta()))
+    commitment3 = commit(points, poly[:8])
+    proof3 = prove_evaluation(points, commitment3, poly[:8], 10, 62951413)
+    batch = [(commitment, proof2, 10, 3979853562951413), (commitment3, proof3, 10, 62951413)]
+    assert verify_evaluations_batch(points, batch)
+    assert not verify_evaluations_batch(points, batch[:1] + [(commitment, proof2, 10, 3979853562951414)])
+    print("Evaluation proof batch verified: {:.3f}s".format(get_time_delta()))
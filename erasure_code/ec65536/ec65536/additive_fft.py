@@ -0,0 +1,111 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The GF(2**16) kernel over ec65536's modulus, shared with poly_utils
+from poly_utils import degree, field
+
+# Additive FFT over GF(2**16) in the "novel polynomial basis" of Lin, Chung and Han
+# (https://arxiv.org/abs/1404.3458), used to extend data without ever going through
+# coefficient form in the standard basis.
+#
+# Let W_j(x) = prod(x - a for a in range(2**j)) be the vanishing polynomial of the subspace
+# range(2**j), and What_j(x) = W_j(x) / W_j(2**j). W_j is linear (W_j(x + y) = W_j(x) +
+# W_j(y)), and What_j is zero on range(2**j) and one on 2**j + range(2**j). The basis
+# polynomial X_i is the product of What_j for all bits j set in i. Then, splitting the
+# coefficients of D(x) = sum(d_i * X_i(x)) in two halves D0 and D1 (with 2**k coefficients),
+# D(x) = D0(x) + What_(k-1)(x) * D1(x). Over the coset offset + range(2**k), What_(k-1) is
+# the constant s = What_(k-1)(offset) on the first half and s + 1 on the second half, so
+# evaluating D is two half-size problems over the halves, for D0 + s * D1 and D0 + (s + 1) * D1.
+# This gives an O(n log(n)) transform with one multiplication per butterfly.
+#
+# Values are numpy uint16 arrays of shape (n, lanes): every lane is a separate polynomial,
+# and all lanes share the twiddle factors.
+
+# What[j][t] = What_j(2**t)
+def _mk_subspace_poly_table():
+    # W_0(x) = x; W_(j+1)(x) = W_j(x) * W_j(x + 2**j) = W_j(x) * (W_j(x) + W_j(2**j))
+    W = [[1 << t for t in range(degree)]]
+    for j in range(degree - 1):
+        W.append([field.mul(w, w ^ W[j][j]) for w in W[j]])
+    return [[field.mul(w, field.inv(Wj[j])) for w in Wj] for j, Wj in enumerate(W)]
+
+What = _mk_subspace_poly_table()
+
+# Levels with at most this many blocks multiply with a full product table per block (one
+# lookup per point instead of a log and an exp lookup)
+MAX_PRODUCT_TABLE_BLOCKS = 16
+
+_twiddle_cache = {}
+
+def get_twiddles(size, offset):
+    """
+    For a transform over offset + range(size) (offset a multiple of size), the twiddle
+    factors of each level j = 1 ... log2(size): What_(j-1) evaluated at the offset of each
+    block of 2**j points. Given as logs (shape (blocks, 1, 1)), or for levels with few blocks
+    as the tables of products of every field element with each twiddle factor
+    """
+    key = (size, offset)
+    if key not in _twiddle_cache:
+        levels = [None]
+        j = 1
+        while 1 << j <= size:
+            block_offsets = offset ^ (np.arange(size >> j, dtype=np.int64) << j)
+            twiddles = np.zeros(size >> j, dtype=np.int64)
+            # What is linear, so evaluate it bit by bit
+            for t in range(degree):
+                twiddles ^= np.where((block_offsets >> t) & 1, What[j - 1][t], 0)
+            if len(twiddles) <= MAX_PRODUCT_TABLE_BLOCKS:
+                levels.append(np.stack([field.product_table(t) for t in twiddles]))
+            else:
+                levels.append(field.log_table[twiddles].reshape(-1, 1, 1))
+            j += 1
+        _twiddle_cache[key] = levels
+    return _twiddle_cache[key]
+
+def _mul_twiddles(twiddles, high):
+    if twiddles.dtype == np.uint16:
+        return np.stack([table[block] for table, block in zip(twiddles, high)])
+    # The log of zero points into the zero-padded part of the exp table, so products with
+    # zero come out as zero without masking
+    return field.exp_table[field.log_table[high] + twiddles]
+
+def fft(coeffs, offset=0):
+    """
+    Evaluates the polynomials with the given novel basis coefficients (shape (n, lanes))
+    over offset + range(n)
+    """
+    n, lanes = coeffs.shape
+    twiddles = get_twiddles(n, offset)
+    o = coeffs.astype(np.uint16, copy=True)
+    for j in range(len(twiddles) - 1, 0, -1):
+        blocks = o.reshape(n >> j, 2, 1 << (j - 1), lanes)
+        low, high = blocks[:, 0], blocks[:, 1]
+        low ^= _mul_twiddles(twiddles[j], high)
+        high ^= low
+    return o
+
+def invfft(values, offset=0):
+    """
+    The inverse of fft: novel basis coefficients of the polynomials (of degree < n) with
+    the given evaluations (shape (n, lanes)) over offset + range(n)
+    """
+    n, lanes = values.shape
+    twiddles = get_twiddles(n, offset)
+    o = values.astype(np.uint16, copy=True)
+    for j in range(1, len(twiddles)):
+        blocks = o.reshape(n >> j, 2, 1 << (j - 1), lanes)
+        low, high = blocks[:, 0], blocks[:, 1]
+        high ^= low
+        low ^= _mul_twiddles(twiddles[j], high)
+    return o
+
+def extend(values, factor=2):
+    """
+    Given the evaluations of polynomials of degree < n over range(n) (shape (n, lanes),
+    n a power of two), returns their evaluations over range(n, factor * n)
+    """
+    n = values.shape[0]
+    coeffs = invfft(values)
+    return np.concatenate([fft(coeffs, n * i) for i in range(1, factor)])
@@ -1,6 +1,16 @@
 import copy
 import poly_utils
+import additive_fft
 import rlp
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Table-driven GF(2**16) arithmetic on arrays
+field = additive_fft.field
 
 try:
     from Crypto.Hash import keccak
@@ -64,9 +74,16 @@ assert points_to_chunk(chunk_to_points(testdata)) == testdata
 
 # Make a Merkle tree out of a set of chunks
 def merklize(chunks):
+    return merklize_hashes([sha3(x) for x in chunks])
+
+# Make a Merkle tree out of a set of leaf hashes
+def merklize_hashes(leaves):
     # Only accept a list of size which is exactly a power of two
-    assert higher_power_of_2(len(chunks)) == len(chunks)
-    merkle_nodes = [sha3(x) for x in chunks]
+    assert higher_power_of_2(len(leaves)) == len(leaves)
+    # A single leaf is its own root
+    if len(leaves) == 1:
+        return [b'\x00' * 32, leaves[0]]
+    merkle_nodes = leaves[::]
     lower_tier = merkle_nodes[::]
     higher_tier = []
     while len(higher_tier) != 1:
@@ -76,22 +93,36 @@ def merklize(chunks):
     merkle_nodes.insert(0, b'\x00' * 32)
     return merkle_nodes
 
+# Extend a list of 2**k chunks with (factor - 1) * 2**k more: point i of new chunk x is the
+# evaluation at x of the polynomial of degree < 2**k going through point i of all original
+# chunks. With numpy, all POINTS_IN_CHUNK lanes are extended together with the additive FFT
+def extend_chunks(byte_chunks, factor=2):
+    if np is None:
+        chunks = [chunk_to_points(byte_chunk) for byte_chunk in byte_chunks]
+        # Compute the polynomials representing the ith number in each chunk
+        polys = [poly_utils.lagrange_interp([chunk[i] for chunk in chunks], list(range(len(chunks)))) for i in range(POINTS_IN_CHUNK)]
+        # Use the polynomials to extend the chunks
+        return [points_to_chunk([poly_utils.eval_poly_at(poly, x) for poly in polys])
+                for x in range(len(chunks), len(chunks) * factor)]
+    return array_to_chunks(additive_fft.extend(chunks_to_array(byte_chunks), factor))
+
+# Deserialize chunks into a (chunks, POINTS_IN_CHUNK) array of points. Points are big-endian;
+# a short chunk is read as zero-padded, like chunk_to_points does
+def chunks_to_array(byte_chunks):
+    data = b''.join([c.ljust(CHUNK_SIZE, b'\x00') for c in byte_chunks])
+    return np.frombuffer(data, dtype='>u2').reshape(len(byte_chunks), POINTS_IN_CHUNK).astype(np.uint16)
+
+def array_to_chunks(points):
+    data = points.astype('>u2').tobytes()
+    return [data[i: i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
 
 class Prover():
     def __init__(self, data):
         # Pad data
         pdata = pad(data)
         byte_chunks = [pdata[i: i + CHUNK_SIZE] for i in range(0, len(pdata), CHUNK_SIZE)]
-        # Decompose it into chunks, where each chunk is a collection of numbers
-        chunks = []
-        for byte_chunk in byte_chunks:
-            chunks.append(chunk_to_points(byte_chunk))
-        # Compute the polynomials representing the ith number in each chunk
-        polys = [poly_utils.lagrange_interp([chunk[i] for chunk in chunks], list(range(len(chunks)))) for i in range(POINTS_IN_CHUNK)]
-        # Use the polynomials to extend the chunks
-        new_chunks = []
-        for x in range(len(chunks), len(chunks) * 2):
-            new_chunks.append(points_to_chunk([poly_utils.eval_poly_at(poly, x) for poly in polys]))
+        # Extend the chunks, treating each as a collection of numbers
+        new_chunks = extend_chunks(byte_chunks)
         # Total length of data including new points
         self.length = len(byte_chunks + new_chunks)
         self.extended_data = byte_chunks + new_chunks
@@ -121,29 +152,99 @@ def verify_proof(merkle_root, proof, index):
         index //= 2
     return h == merkle_root
 
+def _verify_proof_worker(args):
+    return verify_proof(*args)
+
+# Verify the Merkle proofs of many indices, split across worker processes if processes > 1.
+# Returns a list of booleans
+def verify_proofs(merkle_root, proofs, indices, processes=None):
+    args = [(merkle_root, proof, index) for proof, index in zip(proofs, indices)]
+    if processes is None or processes <= 1:
+        return [_verify_proof_worker(a) for a in args]
+    from multiprocessing import Pool
+    with Pool(processes) as pool:
+        return pool.map(_verify_proof_worker, args, chunksize=max(1, len(args) // (processes * 4)))
+
+# Barycentric interpolation weights for recovering all of range(length) from the points at
+# indices, cached as the same index set is typically used for every lane (and for repeated
+# fills with the same availability pattern)
+RECOVERY_CACHE_SIZE = 64
+_recovery_weights = OrderedDict()
+
+def get_recovery_weights(length, indices):
+    """
+    With Z(x) the vanishing polynomial of the indices, the value at any missing x of the
+    polynomial of degree < len(indices) through values y_i at the indices is
+    Z(x) * sum(y_i / (Z'(i) * (x - i))). Returns (missing, log Z(missing), log Z'(indices))
+    """
+    key = (length, tuple(indices))
+    if key in _recovery_weights:
+        _recovery_weights.move_to_end(key)
+        return _recovery_weights[key]
+    indices = np.array(indices, dtype=np.int64)
+    known = np.zeros(length, dtype=bool)
+    known[indices] = True
+    log_sums = np.zeros(length, dtype=np.int64)
+    # Sum log(x - i) over all indices i, a few rows of x at a time. For x an index, this
+    # includes one log(0) term, taken back out below
+    rows = max(1, 2**22 // len(indices))
+    for start in range(0, length, rows):
+        xs = np.arange(start, min(start + rows, length), dtype=np.int64)
+        log_sums[start: start + rows] = field.log_table[xs[:, None] ^ indices[None, :]].sum(axis=1)
+    log_sums -= known * field.log_zero
+    log_sums %= field.order
+    missing = np.nonzero(~known)[0]
+    o = (missing, log_sums[missing], log_sums[indices])
+    _recovery_weights[key] = o
+    if len(_recovery_weights) > RECOVERY_CACHE_SIZE:
+        _recovery_weights.popitem(last=False)
+    return o
+
+# Given the points at indices (shape (len(indices), lanes)), recover the points of all lanes
+# at all of range(length), as one matrix product over GF(2**16) per block of missing rows
+def recover_points(length, points, indices):
+    missing, log_z, log_derivs = get_recovery_weights(length, indices)
+    glog, gexp = field.log_table, field.exp_table
+    indices = np.array(indices, dtype=np.int64)
+    log_points = glog[points]
+    o = np.zeros((length, points.shape[1]), dtype=np.uint16)
+    o[indices] = points
+    rows = max(1, 2**22 // points.size)
+    for start in range(0, len(missing), rows):
+        xs = missing[start: start + rows]
+        # Matrix entries Z(x) / (Z'(i) * (x - i)), as logs
+        log_matrix = (log_z[start: start + rows, None] - log_derivs[None, :] -
+                      glog[xs[:, None] ^ indices[None, :]]) % field.order
+        products = gexp[log_matrix[:, :, None] + log_points[None, :, :]]
+        o[xs] = np.bitwise_xor.reduce(products, axis=1)
+    return o
+
 # Fill data from partially available proofs
 # This method returning False can also be used as a verifier for fraud proofs
-def fill(merkle_root, orig_data_length, proofs, indices):
+def fill(merkle_root, orig_data_length, proofs, indices, processes=None):
     if len(proofs) < orig_data_length:
         raise Exception("Not enough proofs")
     if len(proofs) > orig_data_length:
         raise Exception("Too many proofs; if original data has n chunks, n chunks suffice")
-    for proof, index in zip(proofs, indices):
-        if not verify_proof(merkle_root, proof, index):
+    for valid, index in zip(verify_proofs(merkle_root, proofs, indices, processes), indices):
+        if not valid:
             raise Exception("Merkle proof for index %d invalid" % index)
-    # Convert to points
-    coords = [chunk_to_points(p[0]) for p in proofs]
-    # Extract polynomials
-    polys = [poly_utils.lagrange_interp([c[i] for c in coords], indices) for i in range(POINTS_IN_CHUNK)]
-    # Fill in the remaining values
-    full_coords = [None] * orig_data_length * 2
-    for points, index in zip(coords, indices):
-        full_coords[index] = points
-    for i in range(len(full_coords)):
-        if full_coords[i] is None:
-            full_coords[i] = [poly_utils.eval_poly_at(poly, i) for poly in polys]
-    # Serialize
-    full_chunks = [points_to_chunk(points) for points in full_coords]
+    if np is not None:
+        full_chunks = array_to_chunks(recover_points(orig_data_length * 2, chunks_to_array([p[0] for p in proofs]), indices))
+    else:
+        # Convert to points
+        coords = [chunk_to_points(p[0]) for p in proofs]
+        # Extract polynomials
+        polys = [poly_utils.lagrange_interp([c[i] for c in coords], indices) for i in range(POINTS_IN_CHUNK)]
+        # Fill in the remaining values
+        full_coords = [None] * orig_data_length * 2
+        for points, index in zip(coords, indices):
+            full_coords[index] = points
+        for i in range(len(full_coords)):
+            if full_coords[i] is None:
+                full_coords[i] = [poly_utils.eval_poly_at(poly, i) for poly in polys]
+        # Serialize
+        full_chunks = [points_to_chunk(points) for points in full_coords]
     # Merklize
     merkle_nodes = merklize(full_chunks)
     # Check equality of the Merkle root
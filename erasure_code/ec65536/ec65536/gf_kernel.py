@@ -0,0 +1,152 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Table-driven arithmetic over a binary field GF(2**k), k <= 16, for processing whole
+# buffers of field elements at once. Elements are uint16 numpy arrays, or buffers (bytes,
+# bytearray, memoryview, mmap) of 2-byte symbols.
+#
+# Used by erasure_code/ec65536 (additive_fft, poly_utils) and, through a loader in
+# binary_fft/gf_kernel.py, by binary_fft, which use different moduli (and generators) for
+# GF(2**16).
+#
+# Three ways of multiplying, from the most to the least flexible:
+#  * log/antilog tables: x * y = exp[log[x] + log[y]] (two lookups per product)
+#  * a full product table c * y for all y, for multiplying many elements by the same
+#    constant (one lookup per product, after building a 2**k-entry table)
+#  * split tables: by linearity, c * y = low[y & 255] ^ high[y >> 8], with two 256-entry
+#    tables per constant; cheap to build, so also used without numpy
+
+class GFKernel():
+    def __init__(self, modulus, generator=None):
+        """
+        The field of polynomials over GF(2) modulo the given polynomial (as an integer whose
+        highest bit is x**k). If no generator is given, the smallest one is used
+        """
+        self.modulus = modulus
+        self.height = modulus.bit_length() - 1
+        assert 1 <= self.height <= 16
+        self.order = 2**self.height - 1
+        for base in ([generator] if generator else range(2, min(modulus - 1, 80))):
+            powers = [1]
+            while (len(powers) == 1 or powers[-1] != 1) and len(powers) < self.order + 2:
+                powers.append(self.raw_mul(powers[-1], base))
+            powers.pop()
+            if len(powers) == self.order:
+                break
+        else:
+            raise Exception("Bad modulus")
+        self.generator = base
+        # exps has two periods, so that exps[log(x) + log(y)] needs no reduction
+        self.exps = powers + powers
+        self.logs = [None] * (self.order + 1)
+        for i, p in enumerate(powers):
+            self.logs[p] = i
+        if np is not None:
+            # log(0) is set to 2 * order, and the antilog table is padded with zeroes, so
+            # that any sum (or difference, indexing from the end) involving log(0) lands on
+            # a zero without masking
+            self.log_zero = 2 * self.order
+            self.exp_table = np.zeros(4 * self.order + 1, dtype=np.uint16)
+            self.exp_table[:2 * self.order] = self.exps
+            self.log_table = np.array([self.log_zero] + self.logs[1:], dtype=np.int32)
+
+    # Multiplication by shift-and-add, only used to build the tables
+    def raw_mul(self, a, b):
+        o = 0
+        while b:
+            if b & 1:
+                o ^= a
+            a <<= 1
+            if a >> self.height:
+                a ^= self.modulus
+            b >>= 1
+        return o
+
+    def mul(self, x, y):
+        return 0 if x == 0 or y == 0 else self.exps[self.logs[x] + self.logs[y]]
+
+    def inv(self, x):
+        assert x != 0
+        return self.exps[self.order - self.logs[x]]
+
+    def split_tables(self, c):
+        """
+        Tables (low, high) of 256 entries each, with c * y = low[y & 255] ^ high[y >> 8]
+        """
+        low_bits = [self.mul(c, 1 << i) for i in range(8)]
+        high_bits = [self.mul(c, 1 << i) for i in range(8, 16)] if self.height > 8 else [0] * 8
+        low, high = [0], [0]
+        # Fill in the tables by linearity, one bit at a time
+        for low_bit, high_bit in zip(low_bits, high_bits):
+            low += [v ^ low_bit for v in low]
+            high += [v ^ high_bit for v in high]
+        return low, high
+
+    # Vectorized arithmetic (requires numpy). Takes and returns uint16 arrays, with the
+    # usual numpy broadcasting rules
+    def mul_vec(self, x, y):
+        return self.exp_table[self.log_table[x] + self.log_table[y]]
+
+    def product_table(self, c):
+        """
+        c * y for all y in the field, as a uint16 array
+        """
+        return self.exp_table[self.log_table + self.log_table[c]]
+
+    def mul_scalar_vec(self, c, x):
+        if c == 0:
+            return np.zeros_like(x)
+        if x.size > 4 * len(self.log_table):
+            # For large inputs, first build the table of c * y for all y, then a single
+            # lookup per element is needed
+            return self.product_table(c)[x]
+        return self.exp_table[self.log_table[x] + self.logs[c]]
+
+    def mul_split_vec(self, c, x):
+        low, high = (np.array(t, dtype=np.uint16) for t in self.split_tables(c))
+        return low[x & 255] ^ high[x >> 8]
+
+    # Inverts every element; zeroes map to zero
+    def inv_vec(self, x):
+        return self.exp_table[self.order - self.log_table[x]]
+
+    def eval_polys_vec(self, polys, xs):
+        """
+        Evaluates polynomials (coefficients along the last axis of polys, lowest degree
+        first) at all of xs, by Horner's rule. Returns shape polys.shape[:-1] + xs.shape
+        """
+        polys = np.asarray(polys, dtype=np.uint16)
+        log_xs = self.log_table[np.asarray(xs, dtype=np.uint16)]
+        o = np.zeros(polys.shape[:-1] + log_xs.shape, dtype=np.uint16)
+        extra_dims = (None,) * log_xs.ndim
+        for i in range(polys.shape[-1] - 1, -1, -1):
+            o = self.exp_table[self.log_table[o] + log_xs]
+            o ^= polys[(Ellipsis, i) + extra_dims]
+        return o
+
+    # Bulk operations over buffers of 2-byte symbols (big-endian by default)
+    def axpy(self, c, x, y, byteorder='big'):
+        """
+        y += c * x, where x and y are buffers of the same number of symbols and y is
+        writable (bytearray, writable memoryview or mmap). Returns y
+        """
+        assert len(x) == len(y) and len(x) % 2 == 0
+        if c == 0:
+            return y
+        if np is not None:
+            dtype = np.dtype('>u2' if byteorder == 'big' else '<u2')
+            xs = np.frombuffer(x, dtype=dtype).astype(np.uint16)
+            ys = np.frombuffer(y, dtype=dtype)
+            ys ^= self.mul_scalar_vec(c, xs)
+            return y
+        low, high = self.split_tables(c)
+        x, y = memoryview(x).cast('B'), memoryview(y).cast('B')
+        # Position of the most and least significant byte within a symbol
+        hi, lo = (0, 1) if byteorder == 'big' else (1, 0)
+        for i in range(0, len(x), 2):
+            product = low[x[i + lo]] ^ high[x[i + hi]]
+            y[i + hi] ^= product >> 8
+            y[i + lo] ^= product & 255
+        return y
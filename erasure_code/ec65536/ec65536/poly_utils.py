@@ -1,3 +1,8 @@
+try:
+    from .gf_kernel import GFKernel
+except ImportError:
+    from gf_kernel import GFKernel
+
 modulus_poly = [1, 0, 0, 0, 0, 0, 0, 0,
                 0, 0, 1, 0, 1, 0, 0, 1,
                 1]
@@ -7,24 +12,15 @@ degree = len(modulus_poly) - 1
 two_to_the_degree = 2**degree
 two_to_the_degree_m1 = 2**degree - 1
 
-def galoistpl(a):
-    # 2 is not a primitive root, so we have to use 3 as our logarithm base
-    if a * 2 < two_to_the_degree:
-        return (a * 2) ^ a
-    else:
-        return (a * 2) ^ a ^ modulus_poly_as_int
-
-# Precomputing a log table for increased speed of addition and multiplication
-glogtable = [0] * (two_to_the_degree)
-gexptable = []
-v = 1
-for i in range(two_to_the_degree_m1):
-    glogtable[v] = i
-    gexptable.append(v)
-    v = galoistpl(v)
-
-gexptable += gexptable + gexptable + [0] * two_to_the_degree * 4
+# 2 is not a primitive root, so we have to use 3 as our logarithm base
+field = GFKernel(modulus_poly_as_int, 3)
+
+# The scalar functions below index the kernel's log and antilog tables directly, in a
+# layout where no sum or difference of logs needs reducing: the antilog table is repeated
+# three times then padded with zeroes, and log(0) points into the zeroes
+glogtable = field.logs[:]
 glogtable[0] = two_to_the_degree_m1 * 3
+gexptable = field.exps[:two_to_the_degree_m1] * 3 + [0] * two_to_the_degree * 4
 
 # Add two values in the Galois field
 def galois_add(x, y):
@@ -0,0 +1,150 @@
+import mmap
+import os
+import struct
+import additive_fft
+from ec65536 import CHUNK_SIZE, POINTS_IN_CHUNK, np, extend_chunks, merklize, merklize_hashes, higher_power_of_2
+
+# Streaming erasure coding of files larger than memory.
+#
+# The input file is split into stripes of k chunks (the last one zero-padded), and every
+# stripe is extended independently to n chunks, so only a few stripes are in memory at a
+# time. Both k and n are powers of two with k < n <= 65536. The input file is left as is;
+# the parity chunks and the Merkle trees go to an output file, written through mmap:
+#
+#   header | parity of stripe 0 | ... | tree of stripe 0 | ... | top-level tree
+#
+# where the parity of a stripe is its n - k new chunks, the tree of a stripe is the merklize
+# node list of its n chunks (2n hashes, root at position 1), and the top-level tree is the
+# Merkle tree whose leaves are the stripe roots (padded with zero hashes to a power of two).
+# As n is a power of two, this is the same as one Merkle tree over all chunks of all stripes,
+# so a proof for chunk i of stripe s checks with verify_proof(root, proof, s * n + i).
+
+MAGIC = b'ECS1'
+# magic, k, n, length of the data in bytes, number of stripes
+HEADER_FORMAT = '>4sIIQQ'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+HASH_SIZE = 32
+ZERO_HASH = b'\x00' * HASH_SIZE
+
+class StripeLayout():
+    def __init__(self, k, n, data_length):
+        assert higher_power_of_2(k) == k and higher_power_of_2(n) == n and k < n <= 2**16
+        self.k = k
+        self.n = n
+        self.data_length = data_length
+        self.stripe_size = k * CHUNK_SIZE
+        self.stripe_count = max(1, -(-data_length // self.stripe_size))
+        self.top_width = higher_power_of_2(self.stripe_count)
+        self.parity_size = (n - k) * CHUNK_SIZE
+        self.tree_size = 2 * n * HASH_SIZE
+        self.trees_offset = HEADER_SIZE + self.stripe_count * self.parity_size
+        self.top_offset = self.trees_offset + self.stripe_count * self.tree_size
+        self.file_size = self.top_offset + 2 * self.top_width * HASH_SIZE
+
+    def parity_offset(self, stripe):
+        return HEADER_SIZE + stripe * self.parity_size
+
+    def node_offset(self, stripe, position):
+        return self.trees_offset + stripe * self.tree_size + position * HASH_SIZE
+
+    def top_node_offset(self, position):
+        return self.top_offset + position * HASH_SIZE
+
+# Parity chunks of several stripes of k chunks (bytes of len(stripes) * k * CHUNK_SIZE), as
+# one bytes object of len(stripes) * (n - k) chunks
+def encode_stripes(data, k, n):
+    stripe_count = len(data) // (k * CHUNK_SIZE)
+    if np is None:
+        return b''.join([b''.join(extend_chunks([data[j: j + CHUNK_SIZE] for j in range(i, i + k * CHUNK_SIZE, CHUNK_SIZE)], n // k))
+                         for i in range(0, len(data), k * CHUNK_SIZE)])
+    # All lanes of all stripes are extended together: shape (k, stripes * POINTS_IN_CHUNK)
+    points = np.frombuffer(data, dtype='>u2').reshape(stripe_count, k, POINTS_IN_CHUNK)
+    lanes = points.transpose(1, 0, 2).reshape(k, stripe_count * POINTS_IN_CHUNK).astype(np.uint16)
+    parity = additive_fft.extend(lanes, n // k).reshape(n - k, stripe_count, POINTS_IN_CHUNK)
+    return parity.transpose(1, 0, 2).astype('>u2').tobytes()
+
+def encode_file(data_filename, output_filename, k=256, n=512, batch_size=2**24):
+    """
+    Encode a file, reading about batch_size bytes at a time, and write the parity and the
+    Merkle trees to output_filename. Returns the top-level Merkle root
+    """
+    layout = StripeLayout(k, n, os.path.getsize(data_filename))
+    stripes_per_batch = max(1, batch_size // layout.stripe_size)
+    with open(output_filename, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, k, n, layout.data_length, layout.stripe_count))
+        f.truncate(layout.file_size)
+    with open(data_filename, 'rb') as data_file, open(output_filename, 'r+b') as f:
+        output = mmap.mmap(f.fileno(), 0)
+        stripe_roots = []
+        for start in range(0, layout.stripe_count, stripes_per_batch):
+            count = min(stripes_per_batch, layout.stripe_count - start)
+            data = bytearray(count * layout.stripe_size)
+            data_file.readinto(data)
+            parity = encode_stripes(data, k, n)
+            output[layout.parity_offset(start): layout.parity_offset(start + count)] = parity
+            for i in range(count):
+                chunks = [data[j: j + CHUNK_SIZE] for j in range(i * layout.stripe_size, (i + 1) * layout.stripe_size, CHUNK_SIZE)] + \
+                    [parity[j: j + CHUNK_SIZE] for j in range(i * layout.parity_size, (i + 1) * layout.parity_size, CHUNK_SIZE)]
+                nodes = merklize(chunks)
+                output[layout.node_offset(start + i, 0): layout.node_offset(start + i + 1, 0)] = b''.join(nodes)
+                stripe_roots.append(nodes[1])
+        top_nodes = merklize_hashes(stripe_roots + [ZERO_HASH] * (layout.top_width - layout.stripe_count))
+        output[layout.top_node_offset(0): layout.top_node_offset(2 * layout.top_width)] = b''.join(top_nodes)
+        output.close()
+    return top_nodes[1]
+
+class StripeProver():
+    """
+    Serves chunks and Merkle proofs of an encoded file, reading only the chunk and the
+    nodes of each proof from disk
+    """
+    def __init__(self, data_filename, output_filename):
+        self.data_file = open(data_filename, 'rb')
+        self.file = open(output_filename, 'rb')
+        self.output = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, k, n, data_length, stripe_count = struct.unpack(HEADER_FORMAT, self.output[:HEADER_SIZE])
+        assert magic == MAGIC
+        self.layout = StripeLayout(k, n, data_length)
+        assert self.layout.stripe_count == stripe_count and len(self.output) == self.layout.file_size
+        self.length = stripe_count * n
+        self.merkle_root = self.top_node(1)
+
+    def node(self, stripe, position):
+        offset = self.layout.node_offset(stripe, position)
+        return self.output[offset: offset + HASH_SIZE]
+
+    def top_node(self, position):
+        offset = self.layout.top_node_offset(position)
+        return self.output[offset: offset + HASH_SIZE]
+
+    def stripe_root(self, stripe):
+        return self.node(stripe, 1)
+
+    def get_chunk(self, index):
+        stripe, position = divmod(index, self.layout.n)
+        if position < self.layout.k:
+            # Data chunks come from the input file, zero-padded past its end
+            self.data_file.seek(stripe * self.layout.stripe_size + position * CHUNK_SIZE)
+            return self.data_file.read(CHUNK_SIZE).ljust(CHUNK_SIZE, b'\x00')
+        offset = self.layout.parity_offset(stripe) + (position - self.layout.k) * CHUNK_SIZE
+        return self.output[offset: offset + CHUNK_SIZE]
+
+    # Make a Merkle proof for some index, in the same format as Prover.prove
+    def prove(self, index):
+        assert 0 <= index < self.length
+        stripe, position = divmod(index, self.layout.n)
+        o = [self.get_chunk(index)]
+        adjusted_index = self.layout.n + position
+        while adjusted_index > 1:
+            o.append(self.node(stripe, adjusted_index ^ 1))
+            adjusted_index >>= 1
+        adjusted_index = self.layout.top_width + stripe
+        while adjusted_index > 1:
+            o.append(self.top_node(adjusted_index ^ 1))
+            adjusted_index >>= 1
+        return o
+
+    def close(self):
+        self.output.close()
+        self.file.close()
+        self.data_file.close()
@@ -0,0 +1,44 @@
+import ec65536
+import os
+import sys
+import time
+
+# Compares the additive FFT encoder with the original Lagrange interpolation based one
+# (checking that they produce the same extension), and measures the encoding throughput
+# of the FFT encoder on larger inputs
+#
+# Usage: python bench_encoder.py [max_megabytes]
+
+def get_chunks(size):
+    pdata = ec65536.pad(os.urandom(size))
+    return [pdata[i: i + ec65536.CHUNK_SIZE] for i in range(0, len(pdata), ec65536.CHUNK_SIZE)]
+
+def extend_chunks_lagrange(byte_chunks):
+    np, ec65536.np = ec65536.np, None
+    try:
+        return ec65536.extend_chunks(byte_chunks)
+    finally:
+        ec65536.np = np
+
+if __name__ == '__main__':
+    max_megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+
+    for size in [100, 4000, 32000]:
+        byte_chunks = get_chunks(size)
+        t1 = time.time()
+        old = extend_chunks_lagrange(byte_chunks)
+        t2 = time.time()
+        new = ec65536.extend_chunks(byte_chunks)
+        t3 = time.time()
+        assert old == new
+        print("%d chunks: Lagrange %.3f sec, FFT %.4f sec" % (len(byte_chunks), t2 - t1, t3 - t2))
+
+    megabytes = 1
+    while megabytes <= max_megabytes:
+        # Just below the size at which padding would double the data
+        byte_chunks = get_chunks(megabytes * 2**20 - 16)
+        t1 = time.time()
+        ec65536.extend_chunks(byte_chunks)
+        t2 = time.time()
+        print("%d MB: encoded in %.3f sec (%.1f MB/s)" % (megabytes, t2 - t1, megabytes / (t2 - t1)))
+        megabytes *= 4
@@ -0,0 +1,46 @@
+import ec65536
+import os
+import random
+import sys
+import time
+
+# Compares fill using batched barycentric recovery with the original per-lane Lagrange
+# interpolation (checking that both recover the same data), then times fills of larger
+# inputs from a random half of the chunks, with a cold and a warm weight cache
+#
+# Usage: python bench_fill.py [max_kilobytes] [processes]
+
+def fill_lagrange(*args):
+    np, ec65536.np = ec65536.np, None
+    try:
+        return ec65536.fill(*args)
+    finally:
+        ec65536.np = np
+
+def random_half(prover):
+    indices = sorted(random.sample(range(prover.length), prover.length // 2))
+    return [prover.prove(i) for i in indices], indices
+
+if __name__ == '__main__':
+    max_kilobytes = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    prover = ec65536.Prover(os.urandom(8000))
+    proofs, indices = random_half(prover)
+    t1 = time.time()
+    old = fill_lagrange(prover.merkle_root, prover.length // 2, proofs, indices)
+    t2 = time.time()
+    new = ec65536.fill(prover.merkle_root, prover.length // 2, proofs, indices, processes)
+    t3 = time.time()
+    assert old == new == prover.extended_data
+    print("%d chunks: Lagrange %.3f sec, barycentric %.4f sec" % (prover.length // 2, t2 - t1, t3 - t2))
+
+    kilobytes = 16
+    while kilobytes <= max_kilobytes:
+        prover = ec65536.Prover(os.urandom(kilobytes * 1024 - 16))
+        proofs, indices = random_half(prover)
+        for label in ("cold", "warm"):
+            t1 = time.time()
+            assert ec65536.fill(prover.merkle_root, prover.length // 2, proofs, indices, processes) == prover.extended_data
+            print("%d KB (%d chunks), %s: filled in %.3f sec" % (kilobytes, prover.length // 2, label, time.time() - t1))
+        kilobytes *= 4
@@ -0,0 +1,58 @@
+import ec65536
+import stripes
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+# Streams a file through the stripe encoder, then checks the parity of a few stripes against
+# extend_chunks and verifies Merkle proofs of random chunks read back from disk
+#
+# Usage: python bench_stripes.py [megabytes] [k] [n]
+
+if __name__ == '__main__':
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    n = int(sys.argv[3]) if len(sys.argv) > 3 else 512
+
+    directory = tempfile.mkdtemp()
+    data_filename = os.path.join(directory, 'data.bin')
+    output_filename = os.path.join(directory, 'encoded.bin')
+    with open(data_filename, 'wb') as f:
+        for _ in range(megabytes):
+            f.write(os.urandom(2**20))
+        # Not a whole number of stripes
+        f.write(os.urandom(1000))
+
+    t1 = time.time()
+    root = stripes.encode_file(data_filename, output_filename, k, n)
+    t2 = time.time()
+    print("Encoded %d MB with (k, n) = (%d, %d) in %.2f sec (%.1f MB/s), max RSS %d MB" %
+          (megabytes, k, n, t2 - t1, megabytes / (t2 - t1), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024))
+
+    prover = stripes.StripeProver(data_filename, output_filename)
+    assert prover.merkle_root == root
+    for stripe in [0, prover.layout.stripe_count - 1]:
+        chunks = [prover.get_chunk(stripe * n + i) for i in range(n)]
+        assert ec65536.extend_chunks(chunks[:k], n // k) == chunks[k:]
+    t3 = time.time()
+    for _ in range(1000):
+        index = random.randrange(prover.length)
+        assert ec65536.verify_proof(root, prover.prove(index), index)
+    print("Created and verified 1000 proofs in %.3f sec" % (time.time() - t3))
+    prover.close()
+
+    # Inputs that fit in a single stripe (including an empty one): the stripe root is the
+    # top-level root
+    for size in [0, 1000, k * ec65536.CHUNK_SIZE]:
+        with open(data_filename, 'wb') as f:
+            f.write(os.urandom(size))
+        root = stripes.encode_file(data_filename, output_filename, k, n)
+        prover = stripes.StripeProver(data_filename, output_filename)
+        assert prover.layout.stripe_count == 1 and prover.stripe_root(0) == root
+        for index in range(n):
+            assert ec65536.verify_proof(root, prover.prove(index), index)
+        prover.close()
+    print("Single-stripe inputs encoded and verified")
@@ -0,0 +1,73 @@
+import random, time, sys
+from multicombs import lincomb, lincomb_via_multisubset, pippenger, BLS12_381_G1_BETA, BLS12_381_G1_LAMBDA
+
+# Benchmarks the linear combination algorithms over several group backends: mock integers
+# (where the group operation is integer addition), py_ecc BLS12-381 G1 and, if installed,
+# blst G1. For each backend and size, the algorithms are checked against each other.
+#
+# Usage: python bench_multicombs.py [max_log_size]
+
+def mock_backend():
+    return {
+        'name': 'mock integers',
+        'random_element': lambda: random.randrange(10**20),
+        'adder': lambda x, y: x + y,
+        'zero': 0,
+        'negate': lambda x: -x,
+        'eq': lambda x, y: x == y,
+    }
+
+def py_ecc_backend():
+    from py_ecc import optimized_bls12_381 as b
+    return {
+        'name': 'py_ecc',
+        'random_element': lambda: b.multiply(b.G1, random.randrange(b.curve_order)),
+        'adder': b.add,
+        'zero': b.Z1,
+        'negate': b.neg,
+        'eq': b.eq,
+        'endomorphism': (lambda p: (p[0] * b.FQ(BLS12_381_G1_BETA), p[1], p[2]), BLS12_381_G1_LAMBDA),
+    }
+
+def blst_backend():
+    import blst
+    return {
+        'name': 'blst',
+        'random_element': lambda: blst.G1().mult(random.randrange(2**255)),
+        'adder': lambda x, y: x.dup().add(y),
+        'zero': blst.G1().mult(0),
+        'negate': lambda x: x.dup().neg(),
+        'eq': lambda x, y: x.is_equal(y),
+    }
+
+def bench_backend(backend, sizes, bitlength=255):
+    print("Backend: %s" % backend['name'])
+    adder, zero, negate = backend['adder'], backend['zero'], backend['negate']
+    for size in sizes:
+        numbers = [backend['random_element']() for _ in range(size)]
+        factors = [random.randrange(2**bitlength) for _ in range(size)]
+        algorithms = [
+            ('multisubset', lambda: lincomb_via_multisubset(numbers, factors, adder, zero)),
+            ('pippenger', lambda: pippenger(numbers, factors, adder, zero)),
+            ('pippenger (signed)', lambda: pippenger(numbers, factors, adder, zero, negate)),
+            ('lincomb', lambda: lincomb(numbers, factors, adder, zero, negate)),
+        ]
+        if 'endomorphism' in backend:
+            algorithms.append(('lincomb (GLV)', lambda: lincomb(numbers, factors, adder, zero, negate, backend['endomorphism'])))
+        results = []
+        for name, algorithm in algorithms:
+            start_time = time.time()
+            results.append(algorithm())
+            print("    n=%-6d %-20s %.4f sec" % (size, name, time.time() - start_time))
+        assert all(backend['eq'](results[0], r) for r in results[1:])
+
+if __name__ == '__main__':
+    max_log_size = int(sys.argv[1]) if len(sys.argv) >= 2 else 8
+    bench_backend(mock_backend(), [2**i for i in range(0, max_log_size + 5, 2)])
+    for make_backend in (py_ecc_backend, blst_backend):
+        try:
+            backend = make_backend()
+        except ImportError:
+            print("Skipping %s backend (not installed)" % make_backend.__name__[:-len('_backend')])
+            continue
+        bench_backend(backend, [2**i for i in range(0, max_log_size + 1, 2)])
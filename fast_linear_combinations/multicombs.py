@@ -80,13 +80,13 @@ def multisubset2(numbers, subsets, adder=lambda x,y: x+y, zero=0):
 
 # Reduces a linear combination `numbers[0] * factors[0] + numbers[1] * factors[1] + ...`
 # into a multi-subset problem, and computes the result efficiently
-def lincomb(numbers, factors, adder=lambda x,y: x+y, zero=0):
+def lincomb_via_multisubset(numbers, factors, adder=lambda x,y: x+y, zero=0):
     # Maximum bit length of a number; how many subsets we need to make
-    maxbitlen = max(len(bin(f))-2 for f in factors)
+    maxbitlen = max((len(bin(f))-2 for f in factors), default=0)
     # Compute the subsets: the ith subset contains the numbers whose corresponding factor
     # has a 1 at the ith bit
     subsets = [{i for i in range(len(numbers)) if factors[i] & (1 << j)} for j in range(maxbitlen+1)]
-    subset_sums = multisubset(numbers, subsets, adder=adder, zero=zero)
+    subset_sums = multisubset2(numbers, subsets, adder=adder, zero=zero)
     # For example, suppose a value V has factor 6 (011 in increasing-order binary). Subset 0
     # will not have V, subset 1 will, and subset 2 will. So if we multiply the output of adding
     # subset 0 with twice the output of adding subset 1, with four times the output of adding
@@ -99,6 +99,112 @@ def lincomb(numbers, factors, adder=lambda x,y: x+y, zero=0):
         o = adder(adder(o, o), subset_sums[i])
     return o
 
+# Approximate number of group operations Pippenger's algorithm needs for `count` numbers
+# with factors of `bitlength` bits, using windows of `window_size` bits. Signed windows
+# need half as many buckets, at the cost of one extra window for the final carry
+def pippenger_cost(count, bitlength, window_size, signed=False):
+    windows = (bitlength + window_size - 1) // window_size + (1 if signed else 0)
+    buckets = 2 ** (window_size - 1) if signed else 2 ** window_size - 1
+    return windows * (count + min(count, buckets) + buckets) + bitlength
+
+# Approximate number of group operations of lincomb_via_multisubset
+def multisubset_cost(count, bitlength):
+    partition_size = 1 + int(math.log(bitlength + 2))
+    partitions = (count + partition_size - 1) // partition_size
+    return partitions * (2 ** partition_size + bitlength + 1) + bitlength * 2
+
+# Signed windows must be at least 2 bits wide: with 1-bit windows, the only signed digits are
+# -1 and 0, and the carry never resolves
+def choose_window_size(count, bitlength, signed=False):
+    return min(range(2 if signed else 1, 24), key=lambda c: pippenger_cost(count, bitlength, c, signed))
+
+# Split a factor into `windows` digits of `window_size` bits each, either in the range
+# [0, 2**window_size) or (signed) in the range [-2**(window_size-1), 2**(window_size-1))
+def window_digits(factor, window_size, windows, signed=False):
+    assert window_size >= (2 if signed else 1)
+    mask = 2 ** window_size - 1
+    half = 2 ** (window_size - 1)
+    digits = []
+    for _ in range(windows):
+        digit = factor & mask
+        factor >>= window_size
+        if signed and digit >= half:
+            digit -= 2 ** window_size
+            factor += 1
+        digits.append(digit)
+    assert factor == 0
+    return digits
+
+# Computes the linear combination with Pippenger's bucket method: the factors are split into
+# windows, and for each window every number is added into the bucket of its digit; the weighted
+# sum of the buckets is then computed with a running sum. If `negate` is given, signed windows
+# are used, which halves the number of buckets
+def pippenger(numbers, factors, adder=lambda x,y: x+y, zero=0, negate=None, window_size=None):
+    signed = negate is not None
+    bitlength = max((f.bit_length() for f in factors), default=0)
+    if bitlength == 0:
+        return zero
+    if window_size is None:
+        window_size = choose_window_size(len(numbers), bitlength, signed)
+    windows = (bitlength + window_size - 1) // window_size + (1 if signed else 0)
+    digits = [window_digits(f, window_size, windows, signed) for f in factors]
+    negated = [None] * len(numbers)
+    # `None` stands for zero, so that we never spend group operations adding zero
+    o = None
+    for w in range(windows - 1, -1, -1):
+        if o is not None:
+            for _ in range(window_size):
+                o = adder(o, o)
+        buckets = [None] * (2 ** (window_size - 1) if signed else 2 ** window_size - 1)
+        for i, number in enumerate(numbers):
+            digit = digits[i][w]
+            if digit < 0:
+                if negated[i] is None:
+                    negated[i] = negate(number)
+                number = negated[i]
+                digit = -digit
+            if digit:
+                bucket = buckets[digit - 1]
+                buckets[digit - 1] = number if bucket is None else adder(bucket, number)
+        # Sum of (i+1) * buckets[i], as a sum of running sums from the top bucket down
+        running, total = None, None
+        for bucket in reversed(buckets):
+            if bucket is not None:
+                running = bucket if running is None else adder(running, bucket)
+            if running is not None:
+                total = running if total is None else adder(total, running)
+        if total is not None:
+            o = total if o is None else adder(o, total)
+    return zero if o is None else o
+
+# GLV decomposition: given an endomorphism (phi, lam) of the group with phi(x) = lam * x,
+# rewrites every term f * x as (f % lam) * x + (f // lam) * phi(x). For a group of order r
+# with lam around sqrt(r) (eg. BLS12-381 G1, see BLS12_381_G1_LAMBDA), this halves the bit
+# length of the factors at the cost of twice as many terms
+def glv_split(numbers, factors, endomorphism):
+    phi, lam = endomorphism
+    return numbers + [phi(x) for x in numbers], [f % lam for f in factors] + [f // lam for f in factors]
+
+# For BLS12-381 G1, (x, y) -> (BLS12_381_G1_BETA * x, y) is multiplication by
+# BLS12_381_G1_LAMBDA = z**2 - 1, where z is the curve parameter
+BLS12_381_G1_LAMBDA = 0xd201000000010000 ** 2 - 1
+BLS12_381_G1_BETA = 0x1a0111ea397fe699ec02408663d4de85aa0d857d89759ad4897d29650fb85f9b409427eb4f49fffd8bfd00000000aaac
+
+# Computes the linear combination `numbers[0] * factors[0] + numbers[1] * factors[1] + ...`
+# using only the group addition `adder` (and optionally negation). Uses Pippenger's algorithm
+# with an automatically chosen window size, or the multi-subset method when the cost estimates
+# say it is cheaper (for a small number of values). If an endomorphism (phi, lam) is given,
+# the factors are first halved in size by glv_split
+def lincomb(numbers, factors, adder=lambda x,y: x+y, zero=0, negate=None, endomorphism=None):
+    if endomorphism is not None:
+        numbers, factors = glv_split(numbers, factors, endomorphism)
+    bitlength = max((f.bit_length() for f in factors), default=0)
+    signed = negate is not None
+    window_size = choose_window_size(len(numbers), bitlength, signed)
+    if multisubset_cost(len(numbers), bitlength) < pippenger_cost(len(numbers), bitlength, window_size, signed):
+        return lincomb_via_multisubset(numbers, factors, adder=adder, zero=zero)
+    return pippenger(numbers, factors, adder=adder, zero=zero, negate=negate, window_size=window_size)
+
 # Tests go here
 def make_mock_adder():
     counter = [0]
@@ -119,13 +225,43 @@ def test_multisubset(numcount, setcount):
 def test_lincomb(numcount, bitlength=256):
     numbers = [random.randrange(10**20) for _ in range(numcount)]
     factors = [random.randrange(2**bitlength) for _ in range(numcount)]
-    adder, counter = make_mock_adder()
-    o = lincomb(numbers, factors, adder=adder)
-    assert o == sum([n*f for n,f in zip(numbers, factors)])
     total_ones = sum(bin(f).count('1') for f in factors)
     print("Naive operation count: %d" % (bitlength * numcount + total_ones))
-    print("Optimized operation count: %d" % (bitlength * 2 + counter[0]))
-    print("Optimization factor: %.2f" % ((bitlength * numcount + total_ones) / (bitlength * 2 + counter[0])))
+    adder, counter = make_mock_adder()
+    o = lincomb_via_multisubset(numbers, factors, adder=adder)
+    assert o == sum([n*f for n,f in zip(numbers, factors)])
+    print("Multisubset operation count: %d" % counter[0])
+    for negate in (None, lambda x: -x):
+        adder, counter = make_mock_adder()
+        o = pippenger(numbers, factors, adder=adder, negate=negate)
+        assert o == sum([n*f for n,f in zip(numbers, factors)])
+        print("Pippenger (%s windows) operation count: %d" % ("signed" if negate else "unsigned", counter[0]))
+    adder, counter = make_mock_adder()
+    o = lincomb(numbers, factors, adder=adder, negate=lambda x: -x)
+    assert o == sum([n*f for n,f in zip(numbers, factors)])
+    print("Auto-selected operation count: %d" % counter[0])
+    print("Optimization factor: %.2f" % ((bitlength * numcount + total_ones) / counter[0]))
+
+# Factors of bit length 1 once made the window size search pick 1-bit signed windows
+def test_small_factors():
+    numbers = [3, 5, 7, 11]
+    for negate in (None, lambda x: -x):
+        for factors in ([1, 0, 1, 1], [0, 0, 0, 0], [1, 1, 1, 1], [2, 0, 3, 1]):
+            expected = sum([n*f for n,f in zip(numbers, factors)])
+            assert lincomb(numbers, factors, negate=negate) == expected
+            assert pippenger(numbers, factors, negate=negate) == expected
+
+# With integers modulo a prime, multiplication by any lam is an endomorphism
+def test_glv(numcount, bitlength=256):
+    modulus = 2**255 - 19
+    lam = random.randrange(2**(bitlength // 2))
+    numbers = [random.randrange(modulus) for _ in range(numcount)]
+    factors = [random.randrange(2**bitlength) for _ in range(numcount)]
+    o = lincomb(numbers, factors, adder=lambda x,y: (x+y) % modulus, negate=lambda x: -x % modulus,
+                endomorphism=(lambda x: x * lam % modulus, lam))
+    assert o == sum([n*f for n,f in zip(numbers, factors)]) % modulus
 
 if __name__ == '__main__':
+    test_small_factors()
+    test_glv(40)
     test_lincomb(int(sys.argv[1]) if len(sys.argv) >= 2 else 80)
@@ -0,0 +1,48 @@
+import random
+import sys
+import time
+from py_ecc import optimized_bls12_381 as b
+from kzg_proofs import MODULUS, generate_setup
+from fk20_multi import FK20Context, data_availabilty_using_fk20_multi, data_availabilty_using_fk20_multi_batch
+
+# Compares the throughput (blobs/second) of the batched FK20 multi proof computation with
+# a loop calling data_availabilty_using_fk20_multi once per blob (with shared preprocessing)
+#
+# Usage: python bench_fk20_batch.py [n] [l] [blobs] [processes]
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    l = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    blob_count = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    processes = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    setup = generate_setup(1927409816240961209460912649124, n)
+    polynomials = [[random.randrange(MODULUS) for _ in range(n)] for _ in range(blob_count)]
+
+    start_time = time.time()
+    context = FK20Context(setup, n, l)
+    print("Preprocessing done in {0:.3f} sec".format(time.time() - start_time))
+
+    start_time = time.time()
+    single_proofs = [data_availabilty_using_fk20_multi(p, l, setup, context) for p in polynomials]
+    single_time = time.time() - start_time
+    print("Single-blob loop: {0:.3f} blobs/sec".format(blob_count / single_time))
+
+    start_time = time.time()
+    batch_proofs = data_availabilty_using_fk20_multi_batch(polynomials, l, setup, context, processes)
+    batch_time = time.time() - start_time
+    print("Batched: {0:.3f} blobs/sec".format(blob_count / batch_time))
+
+    for single, batch in zip(single_proofs, batch_proofs):
+        assert all(b.eq(x, y) for x, y in zip(single, batch))
+    print("Speedup: {0:.2f}x".format(single_time / batch_time))
+
+    # A context only works with the setup it was computed for
+    other_setup = generate_setup(31337, n)
+    try:
+        data_availabilty_using_fk20_multi(polynomials[0], l, other_setup, context)
+        assert False
+    except AssertionError as e:
+        assert str(e) == "context is for a different setup"
+    print("Context rejected for a different setup")
+    assert data_availabilty_using_fk20_multi_batch([], l, setup, context) == []
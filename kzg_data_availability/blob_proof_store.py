@@ -0,0 +1,286 @@
+import asyncio
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import OrderedDict
+from py_ecc.bls.point_compression import compress_G1, decompress_G1
+from kzg_proofs import (
+    MODULUS,
+    check_proof_multi,
+    commit_to_poly,
+    generate_setup,
+    get_extended_data,
+    get_root_of_unity,
+    list_to_reverse_bit_order,
+    reverse_bit_order,
+)
+from fk20_multi import FK20Context, data_availabilty_using_fk20_multi
+
+# Store for serving data availability samples: for each blob, the extended data and the
+# KZG multi proof of every cell (coset of l evaluations).
+#
+# All blobs live in one memory-mapped file made of fixed-size slots, so that a cell and its
+# proof are found by pure offset arithmetic and returned as zero-copy memoryview slices.
+# A slot is laid out as
+#
+#   commitment (48 bytes, compressed G1) | cell 0 | cell 1 | ... | cell 2n/l - 1
+#
+# where each cell is l field elements of 32 bytes (in the order of the extended data) followed
+# by the 48-byte compressed proof. When the store is full, the least recently used blob is
+# evicted. The usage order is only kept in memory: after reopening the file, blobs are
+# evicted in slot order until they are used again.
+#
+# The memoryviews returned by get_cell and get_cell_record point into the file, so a later
+# put_blob may overwrite them once their blob is evicted; copy them (bytes(...)) before
+# holding on to them past the next write.
+
+POINT_SIZE = 48
+FIELD_ELEMENT_SIZE = 32
+EMPTY_COMMITMENT = b'\x00' * POINT_SIZE
+
+class BlobProofStore():
+    MAGIC = b'BPS1'
+    HEADER_FORMAT = '>4sIII'
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+    def __init__(self, filename, n, l, capacity):
+        """
+        Open (or create) a store at filename for blobs of n field elements (2n once extended),
+        with cells of l elements, holding at most capacity blobs
+        """
+        self.n = n
+        self.l = l
+        self.capacity = capacity
+        self.cell_count = 2 * n // l
+        self.cell_size = l * FIELD_ELEMENT_SIZE + POINT_SIZE
+        self.slot_size = POINT_SIZE + self.cell_count * self.cell_size
+        size = self.HEADER_SIZE + capacity * self.slot_size
+
+        if not os.path.exists(filename):
+            with open(filename, 'wb') as f:
+                f.write(struct.pack(self.HEADER_FORMAT, self.MAGIC, n, l, capacity))
+                f.truncate(size)
+        self.file = open(filename, 'r+b')
+        self.data = mmap.mmap(self.file.fileno(), 0)
+        assert struct.unpack(self.HEADER_FORMAT, self.data[:self.HEADER_SIZE]) == (self.MAGIC, n, l, capacity)
+        assert len(self.data) == size
+        self.view = memoryview(self.data)
+
+        # commitment -> slot, in least to most recently used order
+        self.slots = OrderedDict()
+        self.free_slots = []
+        for slot in range(capacity):
+            commitment = bytes(self.view[self.slot_offset(slot):self.slot_offset(slot) + POINT_SIZE])
+            if commitment == EMPTY_COMMITMENT:
+                self.free_slots.append(slot)
+            else:
+                self.slots[commitment] = slot
+        self.free_slots.reverse()
+
+    def slot_offset(self, slot):
+        return self.HEADER_SIZE + slot * self.slot_size
+
+    def cell_offset(self, slot, cell_index):
+        return self.slot_offset(slot) + POINT_SIZE + cell_index * self.cell_size
+
+    def __contains__(self, commitment):
+        return commitment in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def put_blob(self, commitment, extended_data, proofs):
+        """
+        Store a blob given its compressed commitment (bytes), its extended data (2n field
+        elements, reverse bit order) and its 2n/l cell proofs (as computed by
+        data_availabilty_using_fk20_multi)
+        """
+        assert len(commitment) == POINT_SIZE and commitment != EMPTY_COMMITMENT
+        assert len(extended_data) == 2 * self.n
+        assert len(proofs) == self.cell_count
+        if commitment in self.slots:
+            self.slots.move_to_end(commitment)
+            return
+        if not self.free_slots:
+            self.evict()
+        slot = self.free_slots.pop()
+        for cell_index, proof in enumerate(proofs):
+            offset = self.cell_offset(slot, cell_index)
+            cell = extended_data[cell_index * self.l:(cell_index + 1) * self.l]
+            self.data[offset:offset + self.cell_size] = \
+                b''.join(y.to_bytes(FIELD_ELEMENT_SIZE, 'big') for y in cell) + \
+                compress_G1(proof).to_bytes(POINT_SIZE, 'big')
+        # Write the commitment last (once the cells are on disk), so a partially written slot
+        # is never picked up on reopen
+        offset = self.slot_offset(slot)
+        self.flush(offset, self.slot_size)
+        self.data[offset:offset + POINT_SIZE] = commitment
+        self.flush(offset, POINT_SIZE)
+        self.slots[commitment] = slot
+
+    def put_polynomial(self, polynomial, setup, context=None):
+        """
+        Compute the commitment, extended data and cell proofs of a polynomial and store them.
+        Returns the compressed commitment
+        """
+        commitment = compress_G1(commit_to_poly(polynomial, setup)).to_bytes(POINT_SIZE, 'big')
+        proofs = data_availabilty_using_fk20_multi(polynomial, self.l, setup, context)
+        self.put_blob(commitment, get_extended_data(polynomial), proofs)
+        return commitment
+
+    def evict(self):
+        """
+        Evict the least recently used blob
+        """
+        commitment, slot = self.slots.popitem(last=False)
+        offset = self.slot_offset(slot)
+        self.data[offset:offset + POINT_SIZE] = EMPTY_COMMITMENT
+        self.flush(offset, POINT_SIZE)
+        self.free_slots.append(slot)
+
+    def get_cell(self, commitment, cell_index):
+        """
+        Returns (data, proof) for a cell as zero-copy memoryview slices: l 32-byte field elements
+        and a 48-byte compressed proof. Returns None if the blob is not in the store
+        """
+        slot = self.slots.get(commitment)
+        if slot is None or not 0 <= cell_index < self.cell_count:
+            return None
+        self.slots.move_to_end(commitment)
+        offset = self.cell_offset(slot, cell_index)
+        split = offset + self.l * FIELD_ELEMENT_SIZE
+        return self.view[offset:split], self.view[split:offset + self.cell_size]
+
+    def get_cell_record(self, commitment, cell_index):
+        """
+        The whole fixed-size record (data followed by proof) of a cell, as a memoryview
+        """
+        slot = self.slots.get(commitment)
+        if slot is None or not 0 <= cell_index < self.cell_count:
+            return None
+        self.slots.move_to_end(commitment)
+        offset = self.cell_offset(slot, cell_index)
+        return self.view[offset:offset + self.cell_size]
+
+    def flush(self, offset, size):
+        """
+        Write a range of the file back to disk (mmap.flush needs a page-aligned offset)
+        """
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        self.data.flush(start, offset + size - start)
+
+    def close(self):
+        """
+        Flush and close the store. Memoryviews returned by get_cell and get_cell_record keep
+        the mapping alive: if any are still referenced, the mapping is only unmapped once the
+        last of them is released, and they stay readable until then
+        """
+        self.data.flush()
+        self.view.release()
+        try:
+            self.data.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+
+def decode_cell(n, l, cell_index, data, proof):
+    """
+    Decode a cell into the arguments for check_proof_multi: (proof, x, ys)
+    """
+    ys = [int.from_bytes(data[i:i + FIELD_ELEMENT_SIZE], 'big') for i in range(0, len(data), FIELD_ELEMENT_SIZE)]
+    x = pow(get_root_of_unity(2 * n), reverse_bit_order(cell_index, 2 * n // l), MODULUS)
+    return decompress_G1(int.from_bytes(proof, 'big')), x, list_to_reverse_bit_order(ys)
+
+
+#########################################################################################
+#
+# Request handler stub
+#
+# A request is the 48-byte commitment followed by the 4-byte big-endian cell index; the
+# response is the cell record, or an empty record (all zero bytes) if it is not available
+#
+#########################################################################################
+
+REQUEST_SIZE = POINT_SIZE + 4
+
+def make_request_handler(store):
+    empty_record = b'\x00' * store.cell_size
+
+    async def handle_requests(reader, writer):
+        try:
+            while True:
+                request = await reader.readexactly(REQUEST_SIZE)
+                cell_index = int.from_bytes(request[POINT_SIZE:], 'big')
+                record = store.get_cell_record(request[:POINT_SIZE], cell_index)
+                # The transport may buffer the response past the next request, so send a copy
+                # rather than a view into a slot that could be evicted in the meantime
+                writer.write(empty_record if record is None else bytes(record))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    return handle_requests
+
+
+async def measure_throughput(store, commitments, request_count, connections=8):
+    """
+    Serve the store on a local port and measure how many cell requests per second a few
+    concurrent clients get answered
+    """
+    server = await asyncio.start_server(make_request_handler(store), '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async def client(count):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        for i in range(count):
+            writer.write(commitments[i % len(commitments)] + (i % store.cell_count).to_bytes(4, 'big'))
+            await writer.drain()
+            await reader.readexactly(store.cell_size)
+        writer.close()
+
+    start_time = time.time()
+    await asyncio.gather(*[client(request_count // connections) for _ in range(connections)])
+    elapsed = time.time() - start_time
+    server.close()
+    await server.wait_closed()
+    return (request_count // connections) * connections / elapsed
+
+
+if __name__ == "__main__":
+    import tempfile
+    import random
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    l = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    request_count = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+
+    setup = generate_setup(1927409816240961209460912649124, n)
+    context = FK20Context(setup, n, l)
+    filename = os.path.join(tempfile.mkdtemp(), 'blobs.bin')
+    store = BlobProofStore(filename, n, l, capacity=2)
+
+    polynomials = [[random.randrange(MODULUS) for _ in range(n)] for _ in range(3)]
+    commitments = [store.put_polynomial(p, setup, context) for p in polynomials]
+    # Capacity is 2, so the first blob has been evicted
+    assert commitments[0] not in store and len(store) == 2
+    print("Stored {0} blobs, evicted the least recently used one".format(len(store)))
+
+    # Reopen the store from disk and check a sample. A view still held when closing the store
+    # does not stop it from closing
+    held_cell = store.get_cell(commitments[1], 0)
+    store.close()
+    assert len(bytes(held_cell[0])) == l * FIELD_ELEMENT_SIZE
+    del held_cell
+    store = BlobProofStore(filename, n, l, capacity=2)
+    commitment = decompress_G1(int.from_bytes(commitments[1], 'big'))
+    for cell_index in range(store.cell_count):
+        proof, x, ys = decode_cell(n, l, cell_index, *store.get_cell(commitments[1], cell_index))
+        assert check_proof_multi(commitment, proof, x, ys, setup)
+    print("All cells of a stored blob verified after reopening the store")
+
+    throughput = asyncio.run(measure_throughput(store, commitments[1:], request_count))
+    print("Served {0:.0f} cell requests/sec".format(throughput))
@@ -1,5 +1,14 @@
+import hashlib
+import mmap
+import os
+import struct
+from collections import OrderedDict
 from py_ecc import optimized_bls12_381 as b
+from py_ecc.bls.point_compression import compress_G1, compress_G2
 from fft import fft
+import g1_fft as g1_fft_module
+from g1_fft import g1_fft, from_py_ecc, to_py_ecc
+from multicombs import lincomb
 import kzg_proofs
 from kzg_proofs import (
     MODULUS,
@@ -23,7 +32,143 @@ from fk20_single import (
 # Toeplitz multiplication via http://www.netlib.org/utk/people/JackDongarra/etemplates/node384.html
 # Multi proof method
 
-def fk20_multi(polynomial, l, setup):
+
+# Setup fingerprints by id(setup), for the most recently used setups
+_setup_fingerprints = OrderedDict()
+SETUP_FINGERPRINT_CACHE_SIZE = 4
+
+
+class FK20Context():
+    """
+    Preprocessing for the FK20 multi proof method for a given setup and parameters. For
+    polynomials of size n and cosets of size l, this is the Fourier transform of the extended
+    setup vectors for each of the l Toeplitz matrices (xext_fft). It is independent of the
+    polynomial coefficients, so it only needs to be computed once per (setup, n, l).
+
+    The preprocessing can be saved to disk as uncompressed affine G1 points (x and y, or all
+    zero bytes for the point at infinity), so that loading needs no square roots. Loading
+    memory-maps the file; the points are decoded (and checked to be on the curve) when the
+    preprocessing is first used.
+    """
+
+    MAGIC = b'FK21'
+    HEADER_FORMAT = '>4sII32s'
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+    COORDINATE_SIZE = 48
+    POINT_SIZE = 2 * COORDINATE_SIZE
+
+    def __init__(self, setup, n, l):
+        k = n // l
+        assert is_power_of_two(n)
+        assert is_power_of_two(l)
+        assert k >= 1
+        self.n = n
+        self.l = l
+        self.fingerprint = FK20Context.setup_fingerprint(setup)
+        self._xext_fft = []
+        for i in range(l):
+            x = setup[0][n - l - 1 - i::-l] + [b.Z1]
+            self._xext_fft.append(toeplitz_part1(x))
+        self._data = None
+
+    @staticmethod
+    def setup_fingerprint(setup):
+        """
+        Hash of the whole setup (both vectors, as compressed points). Serializing takes an
+        inversion per point, so the hash is computed once per setup object and cached
+        """
+        key = id(setup)
+        if key in _setup_fingerprints and _setup_fingerprints[key][0] is setup:
+            _setup_fingerprints.move_to_end(key)
+            return _setup_fingerprints[key][1]
+        g1_points, g2_points = setup
+        h = hashlib.sha256(struct.pack('>II', len(g1_points), len(g2_points)))
+        for point in g1_points:
+            h.update(compress_G1(point).to_bytes(FK20Context.COORDINATE_SIZE, 'big'))
+        for point in g2_points:
+            for z in compress_G2(point):
+                h.update(z.to_bytes(FK20Context.COORDINATE_SIZE, 'big'))
+        # Keep a reference to the setup, so that its id is not reused while cached
+        _setup_fingerprints[key] = (setup, h.digest())
+        if len(_setup_fingerprints) > SETUP_FINGERPRINT_CACHE_SIZE:
+            _setup_fingerprints.popitem(last=False)
+        return _setup_fingerprints[key][1]
+
+    @staticmethod
+    def get_filename(directory, setup, n, l):
+        return os.path.join(directory, 'fk20_{0}_{1}_{2}.bin'.format(
+            FK20Context.setup_fingerprint(setup).hex()[:16], n, l))
+
+    @property
+    def xext_fft(self):
+        if self._xext_fft is None:
+            # Decode the memory-mapped points on first use
+            self._xext_fft = [self.read_row(i) for i in range(self.l)]
+        return self._xext_fft
+
+    def read_row(self, i):
+        row_length = 2 * self.n // self.l
+        p = g1_fft_module.FIELD_MODULUS
+        row = []
+        for j in range(row_length):
+            offset = FK20Context.HEADER_SIZE + (i * row_length + j) * FK20Context.POINT_SIZE
+            x = int.from_bytes(self._data[offset:offset + FK20Context.COORDINATE_SIZE], 'big')
+            y = int.from_bytes(self._data[offset + FK20Context.COORDINATE_SIZE:offset + FK20Context.POINT_SIZE], 'big')
+            if x == y == 0:
+                row.append(None)
+            else:
+                assert x < p and y < p and (y * y - x * x * x - 4) % p == 0, "point not on the curve"
+                row.append((x, y))
+        return to_py_ecc(row)
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(struct.pack(FK20Context.HEADER_FORMAT, FK20Context.MAGIC, self.n, self.l, self.fingerprint))
+            for row in self.xext_fft:
+                for point in from_py_ecc(row):
+                    if point is None:
+                        f.write(b'\x00' * FK20Context.POINT_SIZE)
+                    else:
+                        f.write(point[0].to_bytes(FK20Context.COORDINATE_SIZE, 'big') +
+                                point[1].to_bytes(FK20Context.COORDINATE_SIZE, 'big'))
+
+    @classmethod
+    def load(cls, filename, setup=None):
+        with open(filename, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n, l, fingerprint = struct.unpack(cls.HEADER_FORMAT, data[:cls.HEADER_SIZE])
+        assert magic == cls.MAGIC
+        assert len(data) == cls.HEADER_SIZE + 2 * n * cls.POINT_SIZE
+        if setup is not None:
+            assert fingerprint == cls.setup_fingerprint(setup)
+        context = cls.__new__(cls)
+        context.n = n
+        context.l = l
+        context.fingerprint = fingerprint
+        context._xext_fft = None
+        context._data = data
+        return context
+
+    def check(self, setup, n, l):
+        """
+        Assert that this context is the preprocessing for (setup, n, l)
+        """
+        assert self.n == n and self.l == l
+        assert self.fingerprint == FK20Context.setup_fingerprint(setup), "context is for a different setup"
+
+    @classmethod
+    def load_or_create(cls, setup, n, l, directory):
+        """
+        Load the preprocessing for (setup, n, l) from directory, computing and saving it
+        first if it is not there yet
+        """
+        filename = cls.get_filename(directory, setup, n, l)
+        if not os.path.exists(filename):
+            cls(setup, n, l).save(filename)
+        return cls.load(filename, setup)
+
+
+def fk20_multi(polynomial, l, setup, context=None):
     """
     For a polynomial of size n, let w be a n-th root of unity. Then this method will return
     k=n/l KZG proofs for the points
@@ -32,6 +177,8 @@ def fk20_multi(polynomial, l, setup):
         ...
         proof[i]: w^(i*l + 0), w^(i*l + 1), ... w^(i*l + l - 1)
         ...
+
+    The preprocessing can be passed in as an FK20Context for (setup, n, l)
     """
 
     n = len(polynomial)
@@ -42,10 +189,10 @@ def fk20_multi(polynomial, l, setup):
     
     # Preprocessing part -- this is independent from the polynomial coefficients and can be
     # done before the polynomial is known, it only needs to be computed once
-    xext_fft = []
-    for i in range(l):
-        x = setup[0][n - l - 1 - i::-l] + [b.Z1]
-        xext_fft.append(toeplitz_part1(x))
+    if context is None:
+        context = FK20Context(setup, n, l)
+    context.check(setup, n, l)
+    xext_fft = context.xext_fft
 
     hext_fft = [b.Z1] * 2 * k
     for i in range(l):
@@ -58,13 +205,15 @@ def fk20_multi(polynomial, l, setup):
     h = toeplitz_part3(hext_fft)
 
     # The proofs are the DFT of the h vector
-    return fft(h, MODULUS, get_root_of_unity(k))
+    return g1_fft(h, get_root_of_unity(k))
 
 
-def fk20_multi_data_availability_optimized(polynomial, l, setup):
+def fk20_multi_data_availability_optimized(polynomial, l, setup, context=None):
     """
     FK20 multi-proof method, optimized for dava availability where the top half of polynomial
     coefficients == 0
+
+    The preprocessing can be passed in as an FK20Context for (setup, len(polynomial) // 2, l)
     """
 
     assert is_power_of_two(len(polynomial))
@@ -79,10 +228,10 @@ def fk20_multi_data_availability_optimized(polynomial, l, setup):
 
     # Preprocessing part -- this is independent from the polynomial coefficients and can be
     # done before the polynomial is known, it only needs to be computed once
-    xext_fft = []
-    for i in range(l):
-        x = setup[0][n - l - 1 - i::-l] + [b.Z1]
-        xext_fft.append(toeplitz_part1(x))
+    if context is None:
+        context = FK20Context(setup, n, l)
+    context.check(setup, n, l)
+    xext_fft = context.xext_fft
 
     add_instrumentation()
 
@@ -101,27 +250,108 @@ def fk20_multi_data_availability_optimized(polynomial, l, setup):
     h = h + [b.Z1] * k
 
     # The proofs are the DFT of the h vector
-    return fft(h, MODULUS, get_root_of_unity(2 * k))
+    return g1_fft(h, get_root_of_unity(2 * k))
 
 
-def data_availabilty_using_fk20_multi(polynomial, l, setup):
+def data_availabilty_using_fk20_multi(polynomial, l, setup, context=None):
     """
     Computes all the KZG proofs for data availability checks. This involves sampling on the double domain
     and reordering according to reverse bit order
+
+    The preprocessing can be passed in as an FK20Context for (setup, len(polynomial), l)
     """
     assert is_power_of_two(len(polynomial))
     n = len(polynomial)
     extended_polynomial = polynomial + [0] * n
 
-    all_proofs = fk20_multi_data_availability_optimized(extended_polynomial, l, setup)
+    all_proofs = fk20_multi_data_availability_optimized(extended_polynomial, l, setup, context)
 
     return list_to_reverse_bit_order(all_proofs)
 
 
+def toeplitz_coefficients_fft_batch(polynomials, l):
+    """
+    Scalar part of the FK20 multi proof method for many data availability polynomials (of size n,
+    not yet extended): for each polynomial, the Fourier transforms of the l Toeplitz coefficient
+    vectors
+    """
+    n = len(polynomials[0])
+    k = n // l
+    root_of_unity = get_root_of_unity(2 * k)
+    output = []
+    for polynomial in polynomials:
+        assert len(polynomial) == n
+        output.append([fft(polynomial[- i - 1::l] + [0] * (k + 1) + polynomial[2 * l - i - 1: - l - i:l],
+                           MODULUS, root_of_unity) for i in range(l)])
+    return output
+
+
+_worker_xext_fft = None
+
+def _init_fk20_worker(xext_fft):
+    global _worker_xext_fft
+    _worker_xext_fft = xext_fft
+
+def _fk20_multi_group_stage(coefficient_ffts, xext_fft=None):
+    """
+    Group element part of the FK20 multi proof method for one polynomial, given the Fourier
+    transforms of its Toeplitz coefficient vectors
+    """
+    if xext_fft is None:
+        xext_fft = _worker_xext_fft
+    l = len(xext_fft)
+    k = len(xext_fft[0]) // 2
+
+    # Sum of the l Toeplitz products in Fourier space, as one linear combination per position
+    hext_fft = [lincomb([xext_fft[i][j] for i in range(l)], [coefficient_ffts[i][j] for i in range(l)],
+                        b.add, b.Z1) for j in range(2 * k)]
+
+    h = toeplitz_part3(hext_fft) + [b.Z1] * k
+
+    # The proofs are the DFT of the h vector
+    return list_to_reverse_bit_order(g1_fft(h, get_root_of_unity(2 * k)))
+
+
+def data_availabilty_using_fk20_multi_batch(polynomials, l, setup, context=None, processes=None):
+    """
+    Computes the data availability proofs (as data_availabilty_using_fk20_multi) for many polynomials
+    of the same size. The preprocessing is shared, the scalar FFTs are done up front for all
+    polynomials, and the group element stages are spread over a process pool.
+
+    Most of the speedup over calling data_availabilty_using_fk20_multi in a loop is within each
+    blob (the l Toeplitz products are summed in Fourier space with one linear combination per
+    position), not from sharing work across blobs.
+    """
+    from multiprocessing import Pool
+
+    if not polynomials:
+        return []
+    n = len(polynomials[0])
+    assert is_power_of_two(n)
+    if context is None:
+        context = FK20Context(setup, n, l)
+    context.check(setup, n, l)
+    xext_fft = context.xext_fft
+
+    coefficient_ffts = toeplitz_coefficients_fft_batch(polynomials, l)
+
+    if processes == 1 or len(polynomials) == 1:
+        return [_fk20_multi_group_stage(c, xext_fft) for c in coefficient_ffts]
+    with Pool(processes, initializer=_init_fk20_worker, initargs=(xext_fft,)) as pool:
+        return pool.map(_fk20_multi_group_stage, coefficient_ffts)
+
+
 def add_instrumentation():
+    """
+    Reset multiplication_count, and count G1 multiplications from here on: calls to b.multiply
+    and the products in the batched multiplications of g1_fft (when run in this process). The
+    counters are only installed once
+    """
     global multiplication_count
     
     multiplication_count = 0
+    if getattr(b.multiply, 'counted', False):
+        return
 
     # Add counter to multiply function for statistics
     b_multiply_ = b.multiply
@@ -131,8 +361,18 @@ def add_instrumentation():
 
         return b_multiply_(*args)
 
+    multiply_and_count.counted = True
     b.multiply = multiply_and_count
 
+    batch_multiply_ = g1_fft_module.batch_multiply
+    def batch_multiply_and_count(points, factors, *args):
+        global multiplication_count
+        multiplication_count += len(points)
+
+        return batch_multiply_(points, factors, *args)
+
+    g1_fft_module.batch_multiply = batch_multiply_and_count
+
 
 if __name__ == "__main__":
     polynomial = [1, 2, 3, 4, 7, 8, 9, 10, 13, 14, 1, 15, MODULUS - 1, 1000, MODULUS - 134, 33] * 32
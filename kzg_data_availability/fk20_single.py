@@ -1,5 +1,6 @@
 from py_ecc import optimized_bls12_381 as b
 from fft import fft
+from g1_fft import g1_fft
 import kzg_proofs
 from kzg_proofs import (
     MODULUS,
@@ -53,7 +54,7 @@ def toeplitz_part1(x):
     # Extend x with zeros (neutral element of G1)
     xext = x + [b.Z1] * len(x)
 
-    xext_fft = fft(xext, MODULUS, root_of_unity, inv=False)
+    xext_fft = g1_fft(xext, root_of_unity)
     
     return xext_fft
 
@@ -77,7 +78,7 @@ def toeplitz_part3(hext_fft):
 
     # Transform back and return the first half of the vector
     # Only the top half is the Toeplitz product, the rest is padding
-    return fft(hext_fft, MODULUS, root_of_unity, inv=True)[:len(hext_fft) // 2]
+    return g1_fft(hext_fft, root_of_unity, inv=True)[:len(hext_fft) // 2]
 
 
 def fk20_single(polynomial, setup):
@@ -97,7 +98,7 @@ def fk20_single(polynomial, setup):
     h = toeplitz_part3(toeplitz_part2(toeplitz_coefficients, xext_fft))
 
     # The proofs are the DFT of the h vector
-    return fft(h, MODULUS, get_root_of_unity(n))
+    return g1_fft(h, get_root_of_unity(n))
 
 
 # Compute all n (single) proofs according to FK20 method
@@ -127,7 +128,7 @@ def fk20_single_data_availability_optimized(polynomial, setup):
     h = h + [b.Z1] * n
 
     # The proofs are the DFT of the h vector
-    return fft(h, MODULUS, get_root_of_unity(2 * n))
+    return g1_fft(h, get_root_of_unity(2 * n))
 
 
 def data_availabilty_using_fk20(polynomial, setup):
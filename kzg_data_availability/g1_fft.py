@@ -0,0 +1,250 @@
+from py_ecc import optimized_bls12_381 as b
+from fft import expand_root_of_unity
+from kzg_proofs import reverse_bit_order
+
+# FFT over G1 elements, specialized for the FK20 preprocessing and Toeplitz products.
+#
+# Compared to the generic fft() (which does one py_ecc scalar multiplication per butterfly),
+# this works on plain integers, and
+#  * precomputes the wNAF recoding of every twiddle factor once per domain,
+#  * converts all points of an FFT level to affine coordinates with a single batched inversion,
+#    so that all additions inside the scalar multiplications are cheaper mixed
+#    (Jacobian + affine) additions,
+#  * can fan out the top-level subtrees of the FFT to worker processes.
+#
+# Affine points are (x, y) tuples of integers, or None for the point at infinity. Jacobian
+# points are (X, Y, Z) tuples of integers representing (X / Z^2, Y / Z^3), with Z = 0 for the
+# point at infinity.
+
+FIELD_MODULUS = b.field_modulus
+MODULUS = b.curve_order
+WNAF_WIDTH = 5
+
+JACOBIAN_INFINITY = (1, 1, 0)
+
+def jacobian_double(pt):
+    X, Y, Z = pt
+    if Z == 0 or Y == 0:
+        return JACOBIAN_INFINITY
+    p = FIELD_MODULUS
+    A = X * X % p
+    B = Y * Y % p
+    C = B * B % p
+    D = 2 * ((X + B) ** 2 - A - C) % p
+    E = 3 * A % p
+    X3 = (E * E - 2 * D) % p
+    Y3 = (E * (D - X3) - 8 * C) % p
+    Z3 = 2 * Y * Z % p
+    return (X3, Y3, Z3)
+
+def jacobian_add_affine(pt, q):
+    """
+    Mixed addition of a Jacobian point and an affine point
+    """
+    if q is None:
+        return pt
+    X1, Y1, Z1 = pt
+    x2, y2 = q
+    if Z1 == 0:
+        return (x2, y2, 1)
+    p = FIELD_MODULUS
+    Z1Z1 = Z1 * Z1 % p
+    U2 = x2 * Z1Z1 % p
+    S2 = y2 * Z1 * Z1Z1 % p
+    H = (U2 - X1) % p
+    r = 2 * (S2 - Y1) % p
+    if H == 0:
+        return jacobian_double(pt) if r == 0 else JACOBIAN_INFINITY
+    HH = H * H % p
+    I = 4 * HH % p
+    J = H * I % p
+    V = X1 * I % p
+    X3 = (r * r - J - 2 * V) % p
+    Y3 = (r * (V - X3) - 2 * Y1 * J) % p
+    Z3 = ((Z1 + H) ** 2 - Z1Z1 - HH) % p
+    return (X3, Y3, Z3)
+
+def affine_neg(q):
+    return None if q is None else (q[0], -q[1] % FIELD_MODULUS)
+
+def batch_inverse(values):
+    """
+    Modular inverses of all nonzero values (zeros map to zero) with a single inversion
+    """
+    p = FIELD_MODULUS
+    partials = [1]
+    for v in values:
+        partials.append(partials[-1] * v % p if v else partials[-1])
+    inv = pow(partials[-1], p - 2, p)
+    outputs = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        if values[i]:
+            outputs[i] = partials[i] * inv % p
+            inv = inv * values[i] % p
+    return outputs
+
+def batch_to_affine(points):
+    """
+    Convert a list of Jacobian points to affine, with one inversion for the whole list
+    """
+    p = FIELD_MODULUS
+    inverses = batch_inverse([Z for X, Y, Z in points])
+    o = []
+    for (X, Y, Z), zinv in zip(points, inverses):
+        if Z == 0:
+            o.append(None)
+        else:
+            zinv2 = zinv * zinv % p
+            o.append((X * zinv2 % p, Y * zinv2 * zinv % p))
+    return o
+
+def wnaf(k, width=WNAF_WIDTH):
+    """
+    Width-w non-adjacent form of k, least significant digit first. All nonzero digits are odd
+    and less than 2^(w-1) in absolute value
+    """
+    digits = []
+    while k > 0:
+        if k & 1:
+            digit = k % (1 << width)
+            if digit >= 1 << (width - 1):
+                digit -= 1 << width
+            k -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        k >>= 1
+    return digits
+
+def batch_multiply(points, factors, width=WNAF_WIDTH):
+    """
+    Multiply affine points[i] by factors[i] (given in wNAF form), returning Jacobian points.
+    The tables of odd multiples of all points are converted to affine together
+    """
+    table_size = 1 << (width - 2)
+    doubles = batch_to_affine([JACOBIAN_INFINITY if q is None else jacobian_double((q[0], q[1], 1))
+                               for q in points])
+    tables = []
+    for q, q2 in zip(points, doubles):
+        if q is None:
+            tables.append([JACOBIAN_INFINITY] * table_size)
+            continue
+        table = [(q[0], q[1], 1)]
+        for _ in range(table_size - 1):
+            table.append(jacobian_add_affine(table[-1], q2))
+        tables.append(table)
+    flat = batch_to_affine([pt for table in tables for pt in table])
+    o = []
+    for i, digits in enumerate(factors):
+        table = flat[i * table_size: (i + 1) * table_size]
+        acc = JACOBIAN_INFINITY
+        for digit in reversed(digits):
+            acc = jacobian_double(acc)
+            if digit > 0:
+                acc = jacobian_add_affine(acc, table[digit >> 1])
+            elif digit < 0:
+                acc = jacobian_add_affine(acc, affine_neg(table[(-digit) >> 1]))
+        o.append(acc)
+    return o
+
+_twiddle_cache = {}
+
+def get_twiddles(roots_of_unity):
+    """
+    wNAF recodings of the twiddle factors for each level of an iterative FFT over the given
+    roots of unity (cached per domain)
+    """
+    key = tuple(roots_of_unity[:2]) + (len(roots_of_unity),)
+    if key not in _twiddle_cache:
+        L = len(roots_of_unity)
+        levels = []
+        half = 1
+        while half < L:
+            stride = L // (half * 2)
+            levels.append([wnaf(roots_of_unity[k * stride]) for k in range(half)])
+            half *= 2
+        _twiddle_cache[key] = levels
+    return _twiddle_cache[key]
+
+def _butterfly_level(o, half, twiddles):
+    """
+    One level of the iterative FFT, combining blocks of size half into blocks of size 2 * half
+    """
+    L = len(o)
+    # Multiply the right hand side of every butterfly by its twiddle factor
+    rights = [start + k + half for start in range(0, L, half * 2) for k in range(half)]
+    products = batch_multiply([o[i] for i in rights], [twiddles[i % half] for i in range(len(rights))])
+    new_o = [None] * L
+    for i, y_times_root in zip(rights, products):
+        x = o[i - half]
+        new_o[i - half] = jacobian_add_affine(y_times_root, x)
+        new_o[i] = jacobian_add_affine((y_times_root[0], -y_times_root[1] % FIELD_MODULUS, y_times_root[2]), x)
+    # One inversion converts the whole level back to affine
+    return batch_to_affine(new_o)
+
+def _g1_fft_affine(vals, roots_of_unity):
+    """
+    Iterative FFT over affine points, returning affine points
+    """
+    L = len(vals)
+    o = [vals[reverse_bit_order(i, L)] for i in range(L)]
+    half = 1
+    for twiddles in get_twiddles(roots_of_unity):
+        o = _butterfly_level(o, half, twiddles)
+        half *= 2
+    return o
+
+def _g1_fft_worker(args):
+    return _g1_fft_affine(*args)
+
+def from_py_ecc(points):
+    """
+    Convert py_ecc (homogeneous projective) points to affine integer points
+    """
+    p = FIELD_MODULUS
+    inverses = batch_inverse([pt[2].n for pt in points])
+    return [None if pt[2].n == 0 else (pt[0].n * zinv % p, pt[1].n * zinv % p)
+            for pt, zinv in zip(points, inverses)]
+
+def to_py_ecc(points):
+    return [b.Z1 if q is None else (b.FQ(q[0]), b.FQ(q[1]), b.FQ.one()) for q in points]
+
+def g1_fft(vals, root_of_unity, inv=False, processes=None):
+    """
+    FFT of a list of py_ecc G1 points; same interface and output as fft(vals, MODULUS,
+    root_of_unity, inv). With processes > 1, the top-level subtrees are computed in worker
+    processes
+    """
+    rootz = expand_root_of_unity(root_of_unity, MODULUS)
+    if len(rootz) > len(vals) + 1:
+        vals = vals + [b.Z1] * (len(rootz) - len(vals) - 1)
+    roots = rootz[:0:-1] if inv else rootz[:-1]
+    L = len(vals)
+    points = from_py_ecc(vals)
+
+    if processes is None or processes <= 1 or L < 4:
+        o = _g1_fft_affine(points, roots)
+    else:
+        from multiprocessing import Pool
+        # Split into 2^s interleaved subproblems, computed in parallel
+        s = 1
+        while 2 ** (s + 1) <= min(processes, L // 2):
+            s += 1
+        branches = 2 ** s
+        with Pool(processes) as pool:
+            subresults = pool.map(_g1_fft_worker,
+                                  [(points[i::branches], roots[::branches]) for i in range(branches)])
+        # In the iterative FFT, after the bottom levels, block j (of L / branches consecutive
+        # values) holds the transform of the subsequence starting at the bit reversal of j.
+        # Lay the subtree outputs out that way and do the top s levels in this process
+        sub_length = L // branches
+        o = [subresults[reverse_bit_order(i // sub_length, branches)][i % sub_length] for i in range(L)]
+        half = sub_length
+        for twiddles in get_twiddles(roots)[L.bit_length() - 1 - s:]:
+            o = _butterfly_level(o, half, twiddles)
+            half *= 2
+
+    if inv:
+        invlen = wnaf(pow(L, MODULUS - 2, MODULUS))
+        o = batch_to_affine(batch_multiply(o, [invlen] * L))
+    return to_py_ecc(o)
@@ -1,3 +1,4 @@
+import secrets
 from py_ecc import optimized_bls12_381 as b
 from fft import fft
 from multicombs import lincomb
@@ -95,6 +96,91 @@ def div_polys(a, b):
         diff -= 1
     return [x % MODULUS for x in o]
 
+def div_polys_linear(a, z):
+    """
+    Quotient of a by (x - z), by synthetic division (one pass, no inversions). The remainder
+    a(z) is dropped
+    """
+    o = [0] * (len(a) - 1)
+    carry = 0
+    for i in range(len(a) - 1, 0, -1):
+        carry = (a[i] + carry * z) % MODULUS
+        o[i - 1] = carry
+    return o
+
+def div_polys_xn_minus_c(a, n, c):
+    """
+    Quotient of a by (x^n - c). Going from the top, each block of n quotient coefficients is
+    the matching block of a plus c times the block above it, so this is a single pass
+    """
+    o = [x % MODULUS for x in a[n:]]
+    for i in range(len(o) - n - 1, -1, -1):
+        o[i] = (o[i] + c * o[i + n]) % MODULUS
+    return o
+
+def mul_polys(a, b):
+    """
+    Product of two polynomials in coefficient form, using FFTs
+    """
+    size = 1
+    while size < len(a) + len(b) - 1:
+        size *= 2
+    root_of_unity = get_root_of_unity(size)
+    evaluations = [x * y % MODULUS for x, y in zip(fft(a + [0] * (size - len(a)), MODULUS, root_of_unity),
+                                                     fft(b + [0] * (size - len(b)), MODULUS, root_of_unity))]
+    return fft(evaluations, MODULUS, root_of_unity, True)[:len(a) + len(b) - 1]
+
+def inv_poly_mod_xn(a, n):
+    """
+    Inverse of a modulo x^n (a[0] must be nonzero), by Newton iteration: each step doubles
+    the number of correct coefficients using b <- b * (2 - a * b)
+    """
+    o = [inv(a[0])]
+    k = 1
+    while k < n:
+        k = min(2 * k, n)
+        ab = mul_polys(a[:k], o)[:k]
+        correction = [(-x) % MODULUS for x in ab]
+        correction[0] = (correction[0] + 2) % MODULUS
+        o = mul_polys(o, correction)[:k]
+    return o
+
+def div_polys_fft(a, b):
+    """
+    Quotient of a by b using FFT multiplications: with rev() reversing the coefficient list,
+    rev(a / b) = rev(a) * rev(b)^(-1) mod x^(deg a - deg b + 1)
+    """
+    m = len(a) - len(b) + 1
+    if m <= 0:
+        return []
+    b_rev_inverse = inv_poly_mod_xn(b[::-1], m)
+    quotient_rev = mul_polys(a[::-1][:m], b_rev_inverse)[:m]
+    return quotient_rev[::-1]
+
+# Divisor and quotient length from which FFT division beats schoolbook division (measured
+# with the pure Python fft)
+FFT_DIVISION_THRESHOLD = 2048
+
+def divide_polys(a, b):
+    """
+    Quotient of a by b, picking the fastest method for the shape of the divisor: synthetic
+    division for (x - z), a single pass for (x^n - c), FFT division for other large divisors
+    and schoolbook division otherwise
+    """
+    b = [x % MODULUS for x in b]
+    while b and b[-1] == 0:
+        b.pop()
+    assert b, "division by the zero polynomial"
+    if len(b) > len(a):
+        return []
+    if len(b) >= 2 and b[-1] == 1 and all(x == 0 for x in b[1:-1]):
+        if len(b) == 2:
+            return div_polys_linear(a, -b[0] % MODULUS)
+        return div_polys_xn_minus_c(a, len(b) - 1, -b[0] % MODULUS)
+    if min(len(b), len(a) - len(b) + 1) >= FFT_DIVISION_THRESHOLD:
+        return div_polys_fft(a, b)
+    return div_polys(a, b)
+
 #########################################################################################
 #
 # Utils for reverse bit order
@@ -102,20 +188,44 @@ def div_polys(a, b):
 #########################################################################################
 
 
+_reverse_bit_order_tables = {}
+
+def get_reverse_bit_order_table(order):
+    """
+    Permutation table mapping i to the bit reversal of i, for all i < order (cached per order)
+    """
+    if order not in _reverse_bit_order_tables:
+        assert is_power_of_two(order)
+        bits = order.bit_length() - 1
+        table = [0] * order
+        for i in range(1, order):
+            table[i] = (table[i >> 1] >> 1) | ((i & 1) << (bits - 1))
+        _reverse_bit_order_tables[order] = table
+    return _reverse_bit_order_tables[order]
+
+
 def reverse_bit_order(n, order):
     """
     Reverse the bit order of an integer n
     """
-    assert is_power_of_two(order)
-    # Convert n to binary with the same number of bits as "order" - 1, then reverse its bit order
-    return int(('{:0' + str(order.bit_length() - 1) + 'b}').format(n)[::-1], 2)
+    return get_reverse_bit_order_table(order)[n]
     
 
 def list_to_reverse_bit_order(l):
     """
     Convert a list between normal and reverse bit order. This operation is idempotent.
     """
-    return [l[reverse_bit_order(i, len(l))] for i in range(len(l))]
+    return [l[i] for i in get_reverse_bit_order_table(len(l))]
+
+
+def list_to_reverse_bit_order_in_place(l):
+    """
+    Convert a list between normal and reverse bit order without allocating a new list
+    """
+    for i, j in enumerate(get_reverse_bit_order_table(len(l))):
+        if i < j:
+            l[i], l[j] = l[j], l[i]
+    return l
 
 
 #########################################################################################
@@ -139,7 +249,7 @@ def get_data(polynomial):
     """
     assert is_power_of_two(len(polynomial))
     root_of_unity = get_root_of_unity(len(polynomial))
-    return list_to_reverse_bit_order(fft(polynomial, MODULUS, root_of_unity, False))
+    return list_to_reverse_bit_order_in_place(fft(polynomial, MODULUS, root_of_unity, False))
 
 def get_extended_data(polynomial):
     """
@@ -148,7 +258,7 @@ def get_extended_data(polynomial):
     assert is_power_of_two(len(polynomial))
     extended_polynomial = polynomial + [0] * len(polynomial)
     root_of_unity = get_root_of_unity(len(extended_polynomial))
-    return list_to_reverse_bit_order(fft(extended_polynomial, MODULUS, root_of_unity, False))
+    return list_to_reverse_bit_order_in_place(fft(extended_polynomial, MODULUS, root_of_unity, False))
 
 #########################################################################################
 #
@@ -166,7 +276,7 @@ def compute_proof_single(polynomial, x, setup):
     """
     Compute Kate proof for polynomial in coefficient form at position x
     """
-    quotient_polynomial = div_polys(polynomial, [-x, 1])
+    quotient_polynomial = divide_polys(polynomial, [-x, 1])
     return lincomb(setup[0][:len(quotient_polynomial)], quotient_polynomial, b.add, b.Z1)
 
 def check_proof_single(commitment, proof, x, y, setup):
@@ -201,7 +311,7 @@ def compute_proof_multi(polynomial, x, n, setup):
     an n-th root of unity (this is the proof for one data availability sample, which consists
     of several polynomial evaluations)
     """
-    quotient_polynomial = div_polys(polynomial, [-pow(x, n, MODULUS)] + [0] * (n - 1) + [1])
+    quotient_polynomial = divide_polys(polynomial, [-pow(x, n, MODULUS)] + [0] * (n - 1) + [1])
     return lincomb(setup[0][:len(quotient_polynomial)], quotient_polynomial, b.add, b.Z1)
 
 def check_proof_multi(commitment, proof, x, ys, setup):
@@ -231,6 +341,56 @@ def check_proof_multi(commitment, proof, x, ys, setup):
     pairing = b.final_exponentiate(pairing_check)
     return pairing == b.FQ12.one()
 
+def check_proof_multi_batch(samples, setup):
+    """
+    Check many coset proofs at once. samples is a list of (commitment, proof, x, ys) tuples as
+    passed to check_proof_multi. Returns the list of indices of the samples that failed (empty if
+    all proofs are valid).
+
+    Each equation e([commitment - interpolation_polynomial(s)] + x^n [proof], [1]) = e([proof], [s^n])
+    is weighted with a random factor r and they are all summed, so that a single pairing check with
+    one pairing per distinct coset size is needed. If the combined check fails, the samples are
+    checked one by one to find out which ones are invalid.
+    """
+    if len(samples) == 0:
+        return []
+    weights = [secrets.randbits(128) for _ in samples]
+
+    # Left hand side: sum of r * (commitment + x^n * proof) - sum of r * interpolation_polynomial(s)
+    lhs_points, lhs_factors = [], []
+    interpolation_sum = [0] * max(len(ys) for _, _, _, ys in samples)
+    # Right hand side: sum of r * proof, separately for each coset size n
+    rhs = {}
+    for (commitment, proof, x, ys), r in zip(samples, weights):
+        n = len(ys)
+        lhs_points += [commitment, proof]
+        lhs_factors += [r, r * pow(x, n, MODULUS) % MODULUS]
+
+        # Interpolate at the coset, scaled by r
+        interpolation_polynomial = fft(ys, MODULUS, get_root_of_unity(n), True)
+        inv_x = inv(x)
+        factor = r
+        for i, c in enumerate(interpolation_polynomial):
+            interpolation_sum[i] = (interpolation_sum[i] + c * factor) % MODULUS
+            factor = factor * inv_x % MODULUS
+
+        rhs_points, rhs_factors = rhs.setdefault(n, ([], []))
+        rhs_points.append(proof)
+        rhs_factors.append(r)
+
+    lhs_points += setup[0][:len(interpolation_sum)]
+    lhs_factors += [-c % MODULUS for c in interpolation_sum]
+    lhs = lincomb(lhs_points, lhs_factors, b.add, b.Z1)
+
+    pairing_check = b.pairing(b.G2, lhs, False)
+    for n, (rhs_points, rhs_factors) in rhs.items():
+        pairing_check *= b.pairing(setup[1][n], b.neg(lincomb(rhs_points, rhs_factors, b.add, b.Z1)), False)
+    if b.final_exponentiate(pairing_check) == b.FQ12.one():
+        return []
+
+    return [i for i, (commitment, proof, x, ys) in enumerate(samples)
+            if not check_proof_multi(commitment, proof, x, ys, setup)]
+
 if __name__ == "__main__":
     polynomial = [1, 2, 3, 4, 7, 7, 7, 7, 13, 13, 13, 13, 13, 13, 13, 13]
     n = len(polynomial)
@@ -249,4 +409,31 @@ if __name__ == "__main__":
     ys = [eval_poly_at(polynomial, z) for z in coset]
     proof = compute_proof_multi(polynomial, x, 8, setup)
     assert check_proof_multi(commitment, proof, x, ys, setup)
-    print("Coset check passed")
\ No newline at end of file
+    print("Coset check passed")
+
+    samples = []
+    for x, n in [(5431, 8), (7, 8), (1234, 4), (99, 2)]:
+        root_of_unity = get_root_of_unity(n)
+        coset = [x * pow(root_of_unity, i, MODULUS) for i in range(n)]
+        ys = [eval_poly_at(polynomial, z) for z in coset]
+        samples.append((commitment, compute_proof_multi(polynomial, x, n, setup), x, ys))
+    assert check_proof_multi_batch(samples, setup) == []
+    commitment, proof, x, ys = samples[2]
+    samples[2] = (commitment, proof, x, ys[:-1] + [(ys[-1] + 1) % MODULUS])
+    assert check_proof_multi_batch(samples, setup) == [2]
+    print("Batch coset check passed")
+
+    # Every division method against schoolbook division, including constant divisors
+    for divisor in [[5], [1], [-17, 1], [-17, 0, 0, 1], [3, 1, 4, 1, 5]]:
+        assert divide_polys(polynomial, divisor) == div_polys(polynomial, divisor)
+    # FFT division only kicks in above FFT_DIVISION_THRESHOLD, so check it directly
+    dividend = [pow(3, i, MODULUS) for i in range(3 * FFT_DIVISION_THRESHOLD)]
+    divisor = [pow(5, i, MODULUS) for i in range(FFT_DIVISION_THRESHOLD + 1)]
+    assert div_polys_fft(dividend, divisor) == div_polys(dividend, divisor)
+    assert divide_polys([5, 6, 7], [1]) == [5, 6, 7]
+    try:
+        divide_polys([5, 6, 7], [0, 0])
+        assert False
+    except AssertionError as e:
+        assert str(e) == "division by the zero polynomial"
+    print("Polynomial division check passed")
\ No newline at end of file
@@ -0,0 +1,48 @@
+import contextlib
+import io
+import json
+import sys
+import mimc_stark
+from mimc_stark import mk_mimc_proof
+from profiler import PhaseProfiler
+
+# Times each phase of the STARK prover (and measures its peak memory) for
+# steps = 2**min_logsteps ... 2**max_logsteps, and writes the results as JSON.
+# Memory is measured in a second run, as tracemalloc would inflate the timings
+#
+# Usage: python bench_stark.py [min_logsteps] [max_logsteps] [output_file]
+
+def profile_proof(steps, constants, track_memory):
+    # Start from an empty context cache, so that every run builds (and
+    # measures) the domain data in its 'context' phase
+    mimc_stark._stark_contexts.clear()
+    profiler = PhaseProfiler(track_memory=track_memory)
+    # Silence the prover's progress messages
+    with contextlib.redirect_stdout(io.StringIO()):
+        mk_mimc_proof(3, steps, constants, profiler=profiler)
+    return json.loads(profiler.to_json())
+
+def bench_stark(min_logsteps=10, max_logsteps=16):
+    constants = [(i**7) ^ 42 for i in range(64)]
+    results = []
+    for logsteps in range(min_logsteps, max_logsteps + 1):
+        result = profile_proof(2**logsteps, constants, track_memory=False)
+        memory_result = profile_proof(2**logsteps, constants, track_memory=True)
+        for p, memory_p in zip(result['phases'], memory_result['phases']):
+            assert p['name'] == memory_p['name']
+            p['peak_memory'] = memory_p['peak_memory']
+        result['steps'] = 2**logsteps
+        results.append(result)
+        print('steps=2**%d: %.4f sec' % (logsteps, result['total_time']))
+        for p in result['phases']:
+            print('    %-24s %9.4f sec %12d bytes' % (p['name'], p['time'], p['peak_memory']))
+    return results
+
+if __name__ == '__main__':
+    min_logsteps = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    max_logsteps = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    output_file = sys.argv[3] if len(sys.argv) > 3 else 'bench_stark.json'
+    results = bench_stark(min_logsteps, max_logsteps)
+    with open(output_file, 'w') as file:
+        json.dump(results, file, indent=4)
+    print('Wrote %s' % output_file)
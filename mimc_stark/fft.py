@@ -102,7 +102,51 @@ def mul_polys(a, b, modulus, root_of_unity):
         a = a + [0] * (len(rootz) - len(a) - 1)
     if len(rootz) > len(b) + 1:
         b = b + [0] * (len(rootz) - len(b) - 1)
-    x1 = _fft(a, modulus, rootz[:-1])
-    x2 = _fft(b, modulus, rootz[:-1])
-    return _fft([(v1*v2)%modulus for v1,v2 in zip(x1,x2)],
+    x1 = _ntt(a, modulus, rootz[:-1])
+    x2 = _ntt(b, modulus, rootz[:-1])
+    return _ntt([(v1*v2)%modulus for v1,v2 in zip(x1,x2)],
                modulus, rootz[:0:-1])
+
+# Iterative (in-place, bit-reversed input order) version of _fft. Gives the
+# same output as _fft but avoids the recursion and list slicing
+def _ntt(vals, modulus, roots_of_unity):
+    L = len(roots_of_unity)
+    o = [x % modulus for x in vals]
+    # Bit-reversal permutation
+    j = 0
+    for i in range(1, L):
+        bit = L >> 1
+        while j & bit:
+            j ^= bit
+            bit >>= 1
+        j ^= bit
+        if i < j:
+            o[i], o[j] = o[j], o[i]
+    # Butterflies, one level at a time
+    half = 1
+    while half < L:
+        stride = L // (half * 2)
+        level_roots = roots_of_unity[::stride][:half]
+        for start in range(0, L, half * 2):
+            for k in range(half):
+                x = o[start + k]
+                y_times_root = o[start + k + half] * level_roots[k]
+                o[start + k] = (x + y_times_root) % modulus
+                o[start + k + half] = (x - y_times_root) % modulus
+        half *= 2
+    return o
+
+# Same interface as fft(), using the iterative NTT
+def ntt(vals, modulus, root_of_unity, inv=False):
+    rootz = expand_root_of_unity(root_of_unity, modulus)
+    # Fill in vals with zeroes if needed
+    if len(rootz) > len(vals) + 1:
+        vals = vals + [0] * (len(rootz) - len(vals) - 1)
+    if inv:
+        # Inverse FFT
+        invlen = pow(len(vals), modulus-2, modulus)
+        return [(x*invlen) % modulus for x in
+                _ntt(vals, modulus, rootz[:0:-1])]
+    else:
+        # Regular FFT
+        return _ntt(vals, modulus, rootz[:-1])
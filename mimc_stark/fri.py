@@ -9,8 +9,10 @@ from poly_utils import PrimeField
 # We use maxdeg+1 instead of maxdeg because it's more mathematically
 # convenient in this case.
 
-def prove_low_degree(values, root_of_unity, maxdeg_plus_1, modulus, exclude_multiples_of=0):
+def prove_low_degree(values, root_of_unity, maxdeg_plus_1, modulus, exclude_multiples_of=0, profiler=None):
     f = PrimeField(modulus)
+    if profiler is not None:
+        profiler.phase('fri (degree < %d)' % maxdeg_plus_1)
     print('Proving %d values are degree <= %d' % (len(values), maxdeg_plus_1))
 
     # If the degree we are checking for is less than or equal to 32,
@@ -53,7 +55,8 @@ def prove_low_degree(values, root_of_unity, maxdeg_plus_1, modulus, exclude_mult
 
     # Recurse...
     return [o] + prove_low_degree(column, f.exp(root_of_unity, 4),
-                                  maxdeg_plus_1 // 4, modulus, exclude_multiples_of=exclude_multiples_of)
+                                  maxdeg_plus_1 // 4, modulus, exclude_multiples_of=exclude_multiples_of,
+                                  profiler=profiler)
 
 # Verify an FRI proof
 def verify_low_degree_proof(merkle_root, root_of_unity, proof, maxdeg_plus_1, modulus, exclude_multiples_of=0):
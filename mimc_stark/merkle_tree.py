@@ -33,74 +33,72 @@ def verify_branch(root, index, proof, output_as_int=False):
     assert v == root
     return int.from_bytes(proof[0], 'big') if output_as_int else proof[0]
 
+# Set of all tree nodes on the path from any of the given leaves to the root
+def _get_path_nodes(leaf_indices):
+    path_nodes = set()
+    level = set(leaf_indices)
+    while level:
+        path_nodes |= level
+        level = set(x // 2 for x in level if x > 1)
+    return path_nodes
+
 # Make a compressed proof for multiple indices
 def mk_multi_branch(tree, indices):
-    # Branches we are outputting
+    half_tree_size = len(tree) // 2
+    # Nodes on the path from any leaf to the root can be calculated by the
+    # verifier, so their values never need to be provided
+    path_nodes = _get_path_nodes([half_tree_size + i for i in indices])
+    # Siblings already provided by an earlier branch
+    scanned = set()
     output = []
-    # Elements in the tree we can get from the branches themselves
-    calculable_indices = {}
     for i in indices:
-        new_branch = mk_branch(tree, i)
-        index = len(tree) // 2 + i
-        calculable_indices[index] = True
-        for j in range(1, len(new_branch)):
-            calculable_indices[index ^ 1] = True
-            index //= 2
-        output.append(new_branch)
-    # Fill in the calculable list: if we can get or calculate both children, we can calculate the parent
-    complete = False
-    while not complete:
-        complete = True
-        keys = sorted([x//2 for x in calculable_indices])[::-1]
-        for k in keys:
-            if k*2 in calculable_indices and (k*2)+1 in calculable_indices and k not in calculable_indices:
-                calculable_indices[k] = True
-                complete = False
-    # If for any branch node both children are calculable, or the node overlaps with a leaf, or the node
-    # overlaps with a previously calculated one, elide it
-    scanned = {}
-    for i, b in zip(indices, output):
-        index = len(tree) // 2 + i
-        scanned[index] = True
-        for j in range(1, len(b)):
-            if ((index^1)*2 in calculable_indices and (index^1)*2+1 in calculable_indices) or ((index^1)-len(tree)//2 in indices) or (index^1) in scanned:
-                b[j] = b''
-            scanned[index^1] = True
+        index = half_tree_size + i
+        b = [tree[index]]
+        while index > 1:
+            sibling = index ^ 1
+            if sibling in path_nodes or sibling in scanned:
+                b.append(b'')
+            else:
+                b.append(tree[sibling])
+                scanned.add(sibling)
             index //= 2
+        output.append(b)
     return output
 
 # Verify a compressed proof
 def verify_multi_branch(root, indices, proof):
-    # The values in the Merkle tree we can fill in
-    partial_tree = {}
-    # Fill in elements from the branches
-    for i, b in zip(indices, proof):
-        half_tree_size = 2**(len(b) - 1)
-        index = half_tree_size+i
-        partial_tree[index] = b[0]
-        for j in range(1, len(b)):
-            if b[j]:
-                partial_tree[index ^ 1] = b[j]
-            index //= 2
-    # If we can calculate or get both children, we can calculate the parent
-    complete = False
-    while not complete:
-        complete = True
-        keys = sorted([x//2 for x in partial_tree])[::-1]
-        for k in keys:
-            if k*2 in partial_tree and k*2+1 in partial_tree and k not in partial_tree:
-                partial_tree[k] = blake(partial_tree[k*2] + partial_tree[k*2+1])
-                complete = False
-    # If any branch node is missing, we can calculate it
+    if not indices:
+        return []
+    half_tree_size = 2**(len(proof[0]) - 1)
+    # The values in the Merkle tree we know so far
+    known = {}
+    def add_known(index, value):
+        assert known.setdefault(index, value) == value
+    # Fill in leaves and provided siblings
+    frontier = set()
     for i, b in zip(indices, proof):
+        assert len(b) == len(proof[0])
         index = half_tree_size + i
+        add_known(index, b[0])
+        frontier.add(index)
         for j in range(1, len(b)):
-            if b[j] == b'':
-                b[j] = partial_tree[index ^ 1]
-            partial_tree[index^1] = b[j]
+            if b[j]:
+                add_known(index ^ 1, b[j])
             index //= 2
-    # Verify the branches and output the values
-    return [verify_branch(root, i, b) for i,b in zip(indices, proof)]
+    # Calculate path nodes one level at a time, from the leaves up
+    while frontier != {1}:
+        next_frontier = set()
+        for index in frontier:
+            parent = index // 2
+            if parent in next_frontier:
+                continue
+            left, right = parent * 2, parent * 2 + 1
+            assert left in known and right in known
+            add_known(parent, blake(known[left] + known[right]))
+            next_frontier.add(parent)
+        frontier = next_frontier
+    assert known[1] == root
+    return [b[0] for b in proof]
 
 # Byte length of a multi proof
 def bin_length(proof):
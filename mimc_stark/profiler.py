@@ -0,0 +1,55 @@
+import json
+import time
+import tracemalloc
+
+# Records the wall time (and optionally the peak memory) of successive
+# phases of a computation. Calling phase() ends the current phase and
+# starts a new one; finish() ends the last one. Tracking memory slows
+# down allocations a lot, so timings taken with track_memory are marked
+# as such and are best only compared with each other
+class PhaseProfiler():
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.phases = []
+        self.current = None
+        self.start_time = None
+        # Whether tracemalloc was started by this profiler (and so is
+        # stopped by finish())
+        self.started_tracing = False
+
+    def phase(self, name):
+        self.end_phase()
+        self.current = name
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+            tracemalloc.reset_peak()
+        self.start_time = time.time()
+
+    def finish(self):
+        self.end_phase()
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def end_phase(self):
+        if self.current is None:
+            return
+        record = {'name': self.current, 'time': time.time() - self.start_time}
+        if self.track_memory:
+            record['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        self.phases.append(record)
+        self.current = None
+
+    def total_time(self):
+        return sum(p['time'] for p in self.phases)
+
+    def to_json(self):
+        self.finish()
+        return json.dumps({'phases': self.phases, 'total_time': self.total_time(),
+                           'memory_tracked': self.track_memory}, indent=4)
+
+    def save(self, filename):
+        with open(filename, 'w') as file:
+            file.write(self.to_json())
@@ -1,4 +1,5 @@
-from fft import fft, mul_polys
+from collections import OrderedDict
+from fft import ntt, mul_polys
 
 # Calculates modular inverses [1/values[0], 1/values[1] ...]
 def multi_inv(values, modulus):
@@ -61,52 +62,100 @@ def zpoly(positions, modulus, root_of_unity):
         rootz.append((rootz[-1] * root_of_unity) % modulus)
     return _zpoly(positions, modulus, rootz[:-1])
 
-def erasure_code_recover(vals, modulus, root_of_unity):
-    # Generate the polynomial that is zero at the roots of unity
-    # corresponding to the indices where vals[i] is None
-    import poly_utils
-    z = zpoly([i for i in range(len(vals)) if vals[i] is None],
-              modulus, root_of_unity)
-    zvals = fft(z, modulus, root_of_unity)
-
-    # Pointwise-multiply (vals filling in zero at missing spots) * z
-    # By construction, this equals vals * z
-    vals_with_zeroes = [x or 0 for x in vals]
-    p_times_z_vals = [x*y % modulus for x,y in zip(vals_with_zeroes, zvals)]
-    p_times_z = fft(p_times_z_vals, modulus, root_of_unity, inv=True)
-
-    # Keep choosing k values until the algorithm does not fail
-    # Check only with primitive roots of unity
-    for k in range(2, modulus):
-        if pow(k, (modulus - 1) // 2, modulus) == 1:
-            continue
+# Recovers erased evaluations of low-degree polynomials over the subgroup
+# generated by root_of_unity. Everything that depends only on which
+# positions are missing (the Z polynomial, its evaluations, and the
+# evaluations of Z(k*x) used to divide it out) is cached per missing-index
+# set, so that recovering many codewords with the same loss pattern only
+# costs four NTTs per codeword
+class RecoveryEngine():
+    def __init__(self, modulus, root_of_unity, max_cached_patterns=64):
+        self.modulus = modulus
+        self.root_of_unity = root_of_unity
+        self.max_cached_patterns = max_cached_patterns
+        # Least-recently-used cache of missing-index set -> precomputed data
+        self.patterns = OrderedDict()
+
+    def get_pattern(self, missing):
+        modulus = self.modulus
+        key = tuple(sorted(missing))
+        if key in self.patterns:
+            self.patterns.move_to_end(key)
+            return self.patterns[key]
+        # Generate the polynomial that is zero at the roots of unity
+        # corresponding to the missing indices
+        z = zpoly(list(key), modulus, self.root_of_unity)
+        zvals = ntt(z, modulus, self.root_of_unity)
+        width = len(zvals)
+        # Choose a k such that z(k*x) is nonzero at all evaluation points.
+        # Check only with primitive roots of unity
+        for k in range(2, modulus):
+            if pow(k, (modulus - 1) // 2, modulus) == 1:
+                continue
+            k_powers = [1]
+            for i in range(1, width):
+                k_powers.append(k_powers[-1] * k % modulus)
+            z_of_kx = [x * kp % modulus for x, kp in zip(z, k_powers)]
+            z_of_kx_vals = ntt(z_of_kx, modulus, self.root_of_unity)
+            if 0 not in z_of_kx_vals:
+                break
         invk = pow(k, modulus - 2, modulus)
-        # Convert p_times_z(x) and z(x) into new polynomials
-        # q1(x) = p_times_z(k*x) and q2(x) = z(k*x)
-        # These are likely to not be 0 at any of the evaluation points.
-        p_times_z_of_kx = [x * pow(k, i, modulus) % modulus
-                           for i, x in enumerate(p_times_z)]
-        p_times_z_of_kx_vals = fft(p_times_z_of_kx, modulus, root_of_unity)
-        z_of_kx = [x * pow(k, i, modulus) for i, x in enumerate(z)]
-        z_of_kx_vals = fft(z_of_kx, modulus, root_of_unity)
-        
+        invk_powers = [1]
+        for i in range(1, width):
+            invk_powers.append(invk_powers[-1] * invk % modulus)
+        pattern = {
+            'zvals': zvals,
+            'k_powers': k_powers,
+            'invk_powers': invk_powers,
+            'inv_z_of_kx_vals': multi_inv(z_of_kx_vals, modulus),
+        }
+        self.patterns[key] = pattern
+        if len(self.patterns) > self.max_cached_patterns:
+            self.patterns.popitem(last=False)
+        return pattern
+
+    def _recover_with_pattern(self, vals, pattern):
+        modulus = self.modulus
+        root_of_unity = self.root_of_unity
+
+        # Pointwise-multiply (vals filling in zero at missing spots) * z
+        # By construction, this equals vals * z
+        vals_with_zeroes = [x or 0 for x in vals]
+        p_times_z_vals = [x*y % modulus for x,y in zip(vals_with_zeroes, pattern['zvals'])]
+        p_times_z = ntt(p_times_z_vals, modulus, root_of_unity, inv=True)
+
+        # Convert p_times_z(x) into q1(x) = p_times_z(k*x), which is
+        # divisible by q2(x) = z(k*x), which has no zeroes in the domain
+        p_times_z_of_kx = [x * kp % modulus for x, kp in zip(p_times_z, pattern['k_powers'])]
+        p_times_z_of_kx_vals = ntt(p_times_z_of_kx, modulus, root_of_unity)
+
         # Compute q1(x) / q2(x) = p(k*x)
-        inv_z_of_kv_vals = multi_inv(z_of_kx_vals, modulus)
         p_of_kx_vals = [x*y % modulus for x,y in
-                        zip(p_times_z_of_kx_vals, inv_z_of_kv_vals)]
-        p_of_kx = fft(p_of_kx_vals, modulus, root_of_unity, inv=True)
+                        zip(p_times_z_of_kx_vals, pattern['inv_z_of_kx_vals'])]
+        p_of_kx = ntt(p_of_kx_vals, modulus, root_of_unity, inv=True)
 
         # Given q3(x) = p(k*x), recover p(x)
-        p_of_x = [x * pow(invk, i, modulus) % modulus
-                  for i, x in enumerate(p_of_kx)]
-        output = fft(p_of_x, modulus, root_of_unity)
+        p_of_x = [x * ikp % modulus for x, ikp in zip(p_of_kx, pattern['invk_powers'])]
+        output = ntt(p_of_x, modulus, root_of_unity)
 
         # Check that the output matches the input
-        success = True
         for inpd, outd in zip(vals, output):
-            success *= (inpd is None or inpd == outd)
-        if not success:
-            continue
-
-        # Output the evaluations if all good
+            assert inpd is None or inpd == outd
         return output
+
+    def recover(self, vals):
+        pattern = self.get_pattern([i for i in range(len(vals)) if vals[i] is None])
+        return self._recover_with_pattern(vals, pattern)
+
+    # Recover many codewords; codewords sharing a loss pattern share the
+    # precomputation
+    def recover_batch(self, codewords):
+        return [self.recover(vals) for vals in codewords]
+
+_recovery_engines = {}
+
+def erasure_code_recover(vals, modulus, root_of_unity):
+    key = (modulus, root_of_unity)
+    if key not in _recovery_engines:
+        _recovery_engines[key] = RecoveryEngine(modulus, root_of_unity)
+    return _recovery_engines[key].recover(vals)
@@ -1,5 +1,5 @@
 from fft import fft
-from mimc_stark import mk_mimc_proof, modulus, mimc, verify_mimc_proof
+from mimc_stark import mk_mimc_proof, modulus, mimc, verify_mimc_proof, verify_mimc_proofs, StarkContext
 from merkle_tree import merkelize, mk_branch, verify_branch, bin_length
 from fri import prove_low_degree, verify_low_degree_proof
 
@@ -49,5 +49,38 @@ def test_stark():
     print("Approx proof length: %d (branches), %d (FRI proof), %d (total)" % (L1, L2, L1 + L2))
     assert verify_mimc_proof(3, 2**LOGSTEPS, constants, mimc(3, 2**LOGSTEPS, constants), proof)
 
+def test_stark_batch():
+    LOGSTEPS = 10
+    constants = [(i**7) ^ 42 for i in range(64)]
+    batch = []
+    for inp in range(3, 7):
+        proof = mk_mimc_proof(inp, 2**LOGSTEPS, constants)
+        batch.append((inp, 2**LOGSTEPS, constants, mimc(inp, 2**LOGSTEPS, constants), proof))
+    # Claim a wrong output for the last proof
+    inp, steps, constants, output, proof = batch[-1]
+    batch[-1] = (inp, steps, constants, output + 1, proof)
+    assert verify_mimc_proofs(batch) == [True, True, True, False]
+    print("Batch verification works")
+
+def test_stark_context():
+    import os, tempfile
+    LOGSTEPS = 10
+    constants = [(i**7) ^ 42 for i in range(64)]
+    context = StarkContext(2**LOGSTEPS, constants)
+    context.compute_prover_data()
+    filename = os.path.join(tempfile.mkdtemp(), 'context.bin')
+    context.save(filename)
+    loaded = StarkContext.load(filename, 2**LOGSTEPS, constants)
+    # A context saved for another computation is rejected
+    try:
+        StarkContext.load(filename, 2**LOGSTEPS, constants[::-1])
+        assert False
+    except AssertionError as e:
+        assert str(e) == "context was saved for a different computation"
+    proof = mk_mimc_proof(3, 2**LOGSTEPS, constants, context=loaded)
+    assert proof == mk_mimc_proof(3, 2**LOGSTEPS, constants)
+    assert verify_mimc_proof(3, 2**LOGSTEPS, constants, mimc(3, 2**LOGSTEPS, constants), proof, context=loaded)
+    print("Persisted STARK context works")
+
 if __name__ == '__main__':
     test_stark()
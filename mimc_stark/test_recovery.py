@@ -67,6 +67,24 @@ def test_recovery():
               (2**L, time.time() - a))
     print("Passed expansive test")
     
+def test_recovery_batch():
+    modulus = 2**256 - 2**32 * 351 + 1
+    nonresidue = 7
+    L = 10
+    root_of_unity = pow(nonresidue, (modulus-1)//(2**L), modulus)
+    engine = recovery.RecoveryEngine(modulus, root_of_unity)
+    indices = set(random.sample(range(2**L), 2**L * 3 // 8))
+    datas = [fft.fft([random.randrange(modulus) for i in range(2**(L-1))],
+                     modulus, root_of_unity) for j in range(8)]
+    erased_datas = [[d[i] if i not in indices else None for i in range(2**L)]
+                    for d in datas]
+    a = time.time()
+    assert engine.recover_batch(erased_datas) == datas
+    assert len(engine.patterns) == 1
+    print("Batch recovery of %d datasets of size %i done in time %.4f" %
+          (len(datas), 2**L, time.time() - a))
+
 if __name__ == '__main__':
     test_zpoly()
     test_recovery()
+    test_recovery_batch()
@@ -1,5 +1,6 @@
-from poly_gcd import PrimeFieldExtended
-from fft import fft, shift_poly
+from poly_gcd import PrimeFieldExtended, next_power_of_two
+from fft import fft, _fft, shift_poly, expand_root_of_unity
+from collections import OrderedDict
 from random import randint
 from time import time
 import py_ecc.optimized_bls12_381 as b
@@ -52,6 +53,77 @@ def zero_polynomial_via_multiplication(root_of_unity, zero_vector):
     assert all(a == 0 and b == 0 or a != 0 and b != 0 for a, b in zip(zero_vector, r))
     return r, zero_poly
 
+# Zero polynomials of blocks of this many points are built one linear factor at a time; the
+# product tree above the blocks multiplies with NTTs
+ZERO_POLY_BLOCK_SIZE = 64
+
+_ntt_roots = {}
+
+def get_ntt_roots(size):
+    if size not in _ntt_roots:
+        _ntt_roots[size] = expand_root_of_unity(pow(PRIMITIVE_ROOT_OF_UNITY, (MODULUS - 1) // size, MODULUS), MODULUS)
+    return _ntt_roots[size]
+
+# fft over the size-th roots of unity, with the roots cached per size
+def ntt(vals, size, inv=False):
+    rootz = get_ntt_roots(size)
+    vals = vals + [0] * (size - len(vals))
+    if inv:
+        invlen = pow(size, MODULUS - 2, MODULUS)
+        return [x * invlen % MODULUS for x in _fft(vals, MODULUS, rootz[:0:-1])]
+    return _fft(vals, MODULUS, rootz[:-1])
+
+# A node of the product tree is (poly, evals), with evals the evaluations of poly over the
+# next_power_of_two(deg(poly))-th roots of unity if known (None otherwise). Returns the
+# evaluations over the size-th roots of unity. If the node has them at size / 2, those are
+# the even positions, and only the odd positions (a coset) need a half-size NTT
+def _node_evals(node, size):
+    poly, evals = node
+    if evals is None or 2 * len(evals) != size:
+        return ntt(poly, size)
+    half = size // 2
+    # poly(w * x) for x in the half-size subgroup, with w a size-th root of unity
+    shifted = [c * r % MODULUS for c, r in zip(poly, get_ntt_roots(size))]
+    folded = shifted[:half]
+    for i in range(half, len(shifted)):
+        folded[i - half] += shifted[i]
+    o = [None] * size
+    o[::2] = evals
+    o[1::2] = ntt(folded, half)
+    return o
+
+# Product of two nodes, which are monic polynomials. The product has degree d, and is
+# computed modulo x^size - 1 with size = next_power_of_two(d): if size == d, its leading 1
+# wraps around to the constant term, and is put back in place
+def _mul_nodes(a, b):
+    d = len(a[0]) + len(b[0]) - 2
+    size = next_power_of_two(d)
+    evals = [x * y % MODULUS for x, y in zip(_node_evals(a, size), _node_evals(b, size))]
+    poly = ntt(evals, size, inv=True)[:d]
+    if d == size:
+        poly[0] = (poly[0] - 1) % MODULUS
+    return (poly + [1], evals)
+
+def zero_polynomial_via_product_tree(root_of_unity, zero_vector):
+    roots = expand_root_of_unity(root_of_unity, MODULUS)
+    missing = [roots[i] for i, x in enumerate(zero_vector) if x == 0]
+    nodes = []
+    for start in range(0, len(missing), ZERO_POLY_BLOCK_SIZE):
+        p = [1]
+        for r in missing[start: start + ZERO_POLY_BLOCK_SIZE]:
+            # p * (x - r)
+            p = [(a - r * b) % MODULUS for a, b in zip([0] + p, p + [0])]
+        nodes.append((p, None))
+    nodes = nodes or [([1], None)]
+    # Multiply neighbours pairwise, so that the factors of every product have equal degrees
+    while len(nodes) > 1:
+        nodes = [_mul_nodes(nodes[i], nodes[i + 1]) for i in range(0, len(nodes) - 1, 2)] + nodes[len(nodes) - len(nodes) % 2:]
+    zero_poly = nodes[0][0]
+    assert primefield.degree(zero_poly) == len(list(filter(lambda x: x == 0, zero_vector)))
+    r = fft(zero_poly, primefield.modulus, root_of_unity)
+    assert all(a == 0 and b == 0 or a != 0 and b != 0 for a, b in zip(zero_vector, r))
+    return r, zero_poly
+
 def reconstruct_polynomial_from_samples(root_of_unity, samples, zero_polynomial_function):
     zero_vector = [0 if x is None else 1 for x in samples]
 
@@ -85,6 +157,59 @@ def reconstruct_polynomial_from_samples(root_of_unity, samples, zero_polynomial_
     return reconstructed_data, time_b - time_a
 
 
+class ReconstructionEngine():
+    """
+    Reconstructs data (evaluations over the n-th roots of unity) from samples, caching the
+    work that only depends on which samples are missing.
+
+    With Z the zero polynomial of the missing points and D the data polynomial, E = D * Z is
+    known everywhere in evaluation form (zero at the missing points). Differentiating,
+    E'(x) = D(x) * Z'(x) at every missing x, so D(x) = E'(x) / Z'(x) there. Per loss pattern,
+    Z and 1 / Z' at the missing points are computed once; then reconstructing a polynomial
+    takes one inverse FFT (to get E) and one FFT (to evaluate E').
+
+    The data polynomial must have degree < n / 2, so at most n / 2 samples can be missing.
+    """
+    def __init__(self, n=n, cache_size=16):
+        self.n = n
+        self.root_of_unity = get_ntt_roots(n)[1]
+        self.cache_size = cache_size
+        # missing-index bitmap -> (zero polynomial evaluations, missing indices, 1 / Z'(missing))
+        self.patterns = OrderedDict()
+
+    def get_pattern(self, samples):
+        assert len(samples) == self.n
+        bitmap = sum(1 << i for i, x in enumerate(samples) if x is None)
+        if bitmap in self.patterns:
+            self.patterns.move_to_end(bitmap)
+            return self.patterns[bitmap]
+        missing = [i for i, x in enumerate(samples) if x is None]
+        # With more missing samples, deg(D) + deg(Z) may reach n and E would wrap around
+        assert len(missing) <= self.n // 2, "too many missing samples"
+        zero_vector = [0 if x is None else 1 for x in samples]
+        zero_eval, zero_poly = zero_polynomial_via_product_tree(self.root_of_unity, zero_vector)
+        zero_derivative = [i * c % MODULUS for i, c in enumerate(zero_poly)][1:]
+        derivative_eval = ntt(zero_derivative, self.n)
+        inv_derivatives = primefield.multi_inv([derivative_eval[i] for i in missing])
+        pattern = (zero_eval, missing, inv_derivatives)
+        self.patterns[bitmap] = pattern
+        if len(self.patterns) > self.cache_size:
+            self.patterns.popitem(last=False)
+        return pattern
+
+    def reconstruct(self, samples):
+        zero_eval, missing, inv_derivatives = self.get_pattern(samples)
+        if not missing:
+            return samples[:]
+        poly_with_zero = ntt([(0 if x is None else x) * y % MODULUS for x, y in zip(samples, zero_eval)], self.n, inv=True)
+        # deg(D) + deg(Z) < n, so the n coefficients are exactly those of E
+        derivative_eval = ntt([i * c % MODULUS for i, c in enumerate(poly_with_zero)][1:], self.n)
+        o = samples[:]
+        for i, inv_derivative in zip(missing, inv_derivatives):
+            o[i] = derivative_eval[i] * inv_derivative % MODULUS
+        return o
+
+
 if __name__ == "__main__":
     poly = [i % 10 for i in range(n // 2)]
     data = fft(poly, MODULUS, ROOT_OF_UNITY)
@@ -106,3 +231,27 @@ if __name__ == "__main__":
     time_c = time()
     print("Reconstructed data using zero_polynomial_via_gcd in {0:.2f} s (of which constructing zero poly: {1:.2f} s)".format(time_c - time_b, zero_time_b))
     assert reconstructed_data == data
+
+    reconstructed_data3, zero_time_c = reconstruct_polynomial_from_samples(ROOT_OF_UNITY, samples, zero_polynomial_via_product_tree)
+    time_d = time()
+    print("Reconstructed data using zero_polynomial_via_product_tree in {0:.2f} s (of which constructing zero poly: {1:.2f} s)".format(time_d - time_c, zero_time_c))
+    assert reconstructed_data3 == data
+
+    # Several polynomials with the same loss pattern: the zero polynomial is built once
+    engine = ReconstructionEngine()
+    polys = [[(i * k) % 10 for i in range(n // 2)] for k in range(1, 4)]
+    datas = [fft(p, MODULUS, ROOT_OF_UNITY) for p in polys]
+    for k, d in enumerate(datas):
+        time_e = time()
+        assert engine.reconstruct([None if x is None else y for x, y in zip(samples, d)]) == d
+        print("Reconstructed polynomial {0} with the engine in {1:.2f} s".format(k, time() - time_e))
+
+    # One more missing sample than the engine can recover from
+    too_few = samples[:]
+    too_few[[i for i, x in enumerate(samples) if x is not None][0]] = None
+    try:
+        engine.reconstruct(too_few)
+        assert False
+    except AssertionError as e:
+        assert str(e) == "too many missing samples"
+    print("Rejected a sample set with too many missing samples")